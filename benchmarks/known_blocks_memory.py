@@ -0,0 +1,63 @@
+""" Compare the memory footprint of the conductor's known block numbers held
+in a set() against a Bitmap.
+
+    python benchmarks/known_blocks_memory.py --blocks 20000000
+"""
+import gc
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from blocks.conductor.bitmap import Bitmap
+
+
+def measure(name, factory, blocks):
+    gc.collect()
+    tracemalloc.start()
+    started = time.time()
+
+    container = factory(blocks)
+
+    elapsed = time.time() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('{:<8} {:>12,} blocks {:>10.1f} MiB (peak {:.1f} MiB) in {:.1f}s'.format(
+        name,
+        len(container),
+        current / 1024 / 1024,
+        peak / 1024 / 1024,
+        elapsed,
+    ))
+
+    del container
+
+
+def build_set(blocks):
+    known = set()
+    known.update(range(blocks))
+    return known
+
+
+def build_bitmap(blocks):
+    known = Bitmap()
+    known.add_range(0, blocks)
+    return known
+
+
+def main():
+    parser = ArgumentParser(description='Known block number memory benchmark')
+    parser.add_argument('--blocks', type=int, default=20000000,
+                        help='Number of known blocks')
+    parser.add_argument('--skip-set', action='store_true',
+                        help='Only measure the Bitmap')
+    args = parser.parse_args()
+
+    measure('bitmap', build_bitmap, args.blocks)
+
+    if not args.skip_set:
+        measure('set', build_set, args.blocks)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,47 @@
 """ consumer.py is what stuffs the DB """
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 from uuid import uuid4
 from datetime import datetime, timedelta
-from psycopg2.errors import UniqueViolation
 from eth_utils.encoding import big_endian_to_int
 from eth_utils.hexadecimal import encode_hex
-from web3 import Web3, HTTPProvider
-
-from blocks.config import DSN, JSONRPC_NODE, LOGGER
+from web3 import Web3
+
+from blocks.config import (
+    DSN,
+    JSONRPC_NODE,
+    JSONRPC_BATCH_SIZE,
+    JSONRPC_CONCURRENCY,
+    LOGGER,
+)
 from blocks.db import BlockModel, TransactionModel
 from blocks.enums import WorkerType
-from blocks.conductorclient import ConnectionError, ping, job_request, job_submit, job_reject
+from blocks.exceptions import BatchNotSupported
+from blocks.pipeline import ordered_map
+from blocks.rpc import BatchClient, format_block
+from blocks.session import PooledHTTPProvider
+from blocks.transactions import transaction_row
+from blocks.conductorclient import ConnectionError
 
 log = LOGGER.getChild(__name__)
 
 
 class StoreBlocks(threading.Thread):
-    """ Iterate through all necessary blocks and store them in the DB """
+    """ Iterate through all necessary blocks and store them in the DB.  If
+    fused, each block's full transactions are fetched with it and stored in the
+    same DB transaction, so the block needs no priming or detail jobs.
+    """
 
-    def __init__(self):
+    def __init__(self, direct=False, fused=False):
         super(StoreBlocks, self).__init__()
 
         self.uuid = str(uuid4())
         self.latest_in_db = 0
         self.latest_on_chain = -1
         self.last_ping = None
+        self.fused = fused
 
         self.model = BlockModel(DSN)
         self.tx_model = TransactionModel(DSN)
@@ -35,7 +50,22 @@ class StoreBlocks(threading.Thread):
             from web3.auto.infura import w3 as web3
             self.web3 = web3
         else:
-            self.web3 = Web3(HTTPProvider(JSONRPC_NODE))
+            self.web3 = Web3(PooledHTTPProvider(JSONRPC_NODE))
+
+        self.rpc = BatchClient(
+            getattr(self.web3.providers[0], 'endpoint_uri', JSONRPC_NODE),
+            JSONRPC_BATCH_SIZE,
+        )
+        # Fetches blocks ahead while this thread writes them
+        self.fetcher = ThreadPoolExecutor(max_workers=JSONRPC_CONCURRENCY)
+
+        # Take jobs straight from the DB instead of through the conductor
+        if direct:
+            from blocks import directclient as client
+        else:
+            from blocks import conductorclient as client
+
+        self.client = client
 
         self.shutdown = threading.Event()
 
@@ -47,7 +77,86 @@ class StoreBlocks(threading.Thread):
         if not isinstance(blk_no, int):
             raise ValueError("block_no must be an integer")
 
-        return self.web3.eth.getBlock(blk_no)
+        return self.web3.eth.getBlock(blk_no, self.fused)
+
+    def fetch_blocks(self, block_numbers):
+        """ Gets blocks in a JSON-RPC batch, or one at a time if the node
+        won't take batches
+        """
+        if self.rpc.batching:
+            log.debug("Fetching blocks {}-{}".format(block_numbers[0], block_numbers[-1]))
+
+            try:
+                return [
+                    format_block(blk)
+                    for blk in self.rpc.call(
+                        'eth_getBlockByNumber',
+                        [[hex(blk_no), self.fused] for blk_no in block_numbers],
+                    )
+                ]
+            except BatchNotSupported:
+                log.warning('Node does not support batches, fetching blocks singly')
+
+        return [self.get_block(blk_no) for blk_no in block_numbers]
+
+    def get_blocks(self, block_numbers):
+        """ Gets blocks, with up to JSONRPC_CONCURRENCY batches or single
+        fetches in flight.  Yields chunks of (block number, block) in order.
+        """
+        size = self.rpc.batch_size if self.rpc.batching else 1
+        chunks = [
+            block_numbers[start:start + size]
+            for start in range(0, len(block_numbers), size)
+        ]
+
+        for chunk, blocks in zip(chunks, ordered_map(
+            self.fetcher,
+            self.fetch_blocks,
+            chunks,
+            JSONRPC_CONCURRENCY,
+        )):
+            yield list(zip(chunk, blocks))
+
+    def get_rows(self, block_numbers):
+        """ Gets the DB rows for blocks a fetched chunk at a time, stopping
+        early if told to shut down.  Yields (block rows, transaction rows),
+        with transaction rows only if fused.
+        """
+        for chunk in self.get_blocks(block_numbers):
+
+            # If we've been told to shutdown...
+            if self.shutdown.is_set():
+                log.info("Shutting down gracefully...")
+                return
+
+            rows = []
+            tx_rows = [] if self.fused else None
+
+            for block_no, blk in chunk:
+                log.debug("Block {} has {} transactions".format(
+                    block_no,
+                    len(blk['transactions']),
+                ))
+                rows.append(self.block_row(block_no, blk))
+
+                if self.fused:
+                    tx_rows.extend(transaction_row(tx) for tx in blk['transactions'])
+
+            yield rows, tx_rows
+
+    def block_row(self, block_no, blk):
+        """ Get the DB row for a block from the node """
+        return {
+            'block_number': block_no,
+            'block_timestamp': datetime.fromtimestamp(blk['timestamp']),
+            'difficulty': blk['difficulty'],
+            'hash': encode_hex(blk['hash']),
+            'miner': blk['miner'],
+            'gas_used': blk['gasUsed'],
+            'gas_limit': blk['gasLimit'],
+            'nonce': big_endian_to_int(blk['nonce']),
+            'size': blk['size'],
+        }
 
     def get_meta(self):
         """ Populate some things we'll need later """
@@ -82,7 +191,7 @@ class StoreBlocks(threading.Thread):
                 or self.last_ping < datetime.now() - timedelta(seconds=15)
             ):
                 try:
-                    ping(self.uuid)
+                    self.client.ping(self.uuid)
 
                 except ConnectionError:
                     log.warning('Unable to connect to the conductor.')
@@ -93,7 +202,7 @@ class StoreBlocks(threading.Thread):
 
             try:
                 log.info('Requesting new job for worker {}'.format(self.uuid))
-                job_response = job_request(self.uuid, WorkerType.BLOCK)
+                job_response = self.client.job_request(self.uuid, WorkerType.BLOCK)
             except ConnectionError:
                 log.error('Failed to connect to the conductor.')
                 sleep(3)
@@ -106,55 +215,20 @@ class StoreBlocks(threading.Thread):
                 continue
 
             job = job_response['data']
-            submit = True
 
-            for block_no in job['block_numbers']:
+            # A long-poll that ran out of time without work; just ask again
+            if job is None:
+                continue
 
-                # If we've been told to shutdown...
-                if self.shutdown.is_set():
-                    log.info("Shutting down gracefully...")
-                    break
+            log.info('Inserting {} blocks'.format(len(job['block_numbers'])))
 
-                blk = self.get_block(block_no)
+            for block_no in self.model.insert_blocks(self.get_rows(job['block_numbers'])):
+                log.warning('Block {} already exists in database'.format(block_no))
 
-                try:
-                    log.info('Inserting block {}'.format(block_no))
-                    self.model.insert_dict({
-                        'block_number': block_no,
-                        'block_timestamp': datetime.fromtimestamp(blk['timestamp']),
-                        'difficulty': blk['difficulty'],
-                        'hash': encode_hex(blk['hash']),
-                        'miner': blk['miner'],
-                        'gas_used': blk['gasUsed'],
-                        'gas_limit': blk['gasLimit'],
-                        'nonce': big_endian_to_int(blk['nonce']),
-                        'size': blk['size'],
-                        }, commit=True)
-                except UniqueViolation:
-                    log.warning('Block {} already exists in database'.format(block_no))
-                    job_reject(job.get('job_uuid'), 'Block {} already exist in database'.format(block_no))
-                    submit = False
-                    break
-
-                # Insert transactions
-                log.debug("Block has {} transactions".format(len(blk['transactions'])))
-                # TODO: Disabling transaction insertion here for performance reasons
-                # for txhash in blk['transactions']:
-                #     hex_hash = encode_hex(txhash)
-
-                #     log.info('Inserting tx {}'.format(hex_hash))
-
-                #     try:
-                #         self.tx_model.insert_dict({
-                #             'hash': hex_hash,
-                #             'dirty': True,
-                #             }, commit=True)
-                #     except UniqueViolation:
-                #         log.warning('Transaction already known: {}'.format(hex_hash))
-                #         pass
-
-            if submit:
-                job_submit(job.get('job_uuid'))
+            if self.shutdown.is_set():
+                self.client.job_reject(job.get('job_uuid'), 'Worker shutting down')
+            else:
+                self.client.job_submit(job.get('job_uuid'))
 
     def run(self):
         """ Kick off the process """
@@ -15,19 +15,43 @@ def start_conductor():
     api()
 
 
+def worker_parser(description):
+    """ Build a parser with the command line options shared by the workers """
+    parser = ArgumentParser(description=description)
+    parser.add_argument('--direct', action='store_true',
+                        help='Take jobs straight from the database instead of '
+                        'the conductor')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker threads to run in this process')
+    return parser
+
+
+def worker_args(description):
+    """ Parse the command line options shared by the workers """
+    return worker_parser(description).parse_args()
+
+
 def start_block_consumer():
     """ Startup the block consumer """
-    start_thread(WorkerType.BLOCK)
+    parser = worker_parser('Store blocks')
+    parser.add_argument('--fused', action='store_true',
+                        help='Store each block\'s transactions with it, '
+                        'skipping the priming and detail stages')
+    args = parser.parse_args()
+    start_thread(WorkerType.BLOCK, direct=args.direct, workers=args.workers,
+                 fused=args.fused)
 
 
 def start_transaction_primer():
     """ Startup the transaction primer """
-    start_thread(WorkerType.TX_PRIME)
+    args = worker_args('Store transaction hashes for blocks')
+    start_thread(WorkerType.TX_PRIME, direct=args.direct, workers=args.workers)
 
 
 def start_transaction_consumer():
     """ Startup the transaction consumer """
-    start_thread(WorkerType.TX_DETAIL)
+    args = worker_args('Store transaction details')
+    start_thread(WorkerType.TX_DETAIL, direct=args.direct, workers=args.workers)
 
 
 def analysis():
@@ -1,8 +1,12 @@
 import os
-from flask import Flask, request
-from blocks.db import BlockModel, TransactionModel
+import sys
+import signal
+from flask import Flask, Response, request
+from blocks.db import BlockModel, TransactionModel, create_initial
 from blocks.config import DSN, LOGGER
 from blocks.enums import WorkerType
+from blocks.exceptions import TooManyWaiters
+from blocks.encoding import JSON_TYPE, MSGPACK_TYPE, encode_job, msgpack, pack
 from blocks.conductor.conductor import Conductor
 
 log = LOGGER.getChild('db')
@@ -50,6 +54,11 @@ def status():
     })
 
 
+@app.route('/backlog')
+def backlog():
+    return response_ok(conductor.backpressure.report())
+
+
 @app.route('/ping', methods=('POST',))
 def ping():
     req_obj = request.get_json()
@@ -75,17 +84,45 @@ def job_request():
         and req_obj.get('uuid') is not None
         and req_obj.get('type') is not None
     ):
-        job = conductor.generate_job(
-            WorkerType.from_string(req_obj['type']),
-            req_obj['uuid']
-        )
+        wait = float(req_obj.get('wait') or 0)
+
+        try:
+            job = conductor.generate_job(
+                WorkerType.from_string(req_obj['type']),
+                req_obj['uuid'],
+                wait=wait,
+            )
+        except TooManyWaiters as err:
+            # Have the consumer back off rather than ask again straight away
+            return response_error(str(err))
 
         if job:
-            return response_ok(job.to_dict())
+            return job_response(job, req_obj.get('compact'))
+
+        # Long-polling consumers get an empty success so they know to ask
+        # again straight away
+        if wait > 0:
+            return response_ok(None)
 
     return response_error()
 
 
+def job_response(job, compact=False):
+    """ Respond with a job, compacted and msgpacked if the consumer asked """
+    accepted = [JSON_TYPE, MSGPACK_TYPE] if msgpack else [JSON_TYPE]
+
+    if request.accept_mimetypes.best_match(accepted) == MSGPACK_TYPE:
+        return Response(
+            pack(response_ok(encode_job(job.to_dict(), binary=True))),
+            mimetype=MSGPACK_TYPE
+        )
+
+    if compact:
+        return response_ok(encode_job(job.to_dict()))
+
+    return response_ok(job.to_dict())
+
+
 @app.route('/job-submit', methods=('POST',))
 def job_submit():
     req_obj = request.get_json()
@@ -95,7 +132,11 @@ def job_submit():
         and isinstance(req_obj, dict)
         and req_obj.get('job_uuid') is not None
     ):
-        verified, errors = conductor.verify_job(req_obj['job_uuid'])
+        if req_obj.get('background'):
+            verified, errors = conductor.submit_job(req_obj['job_uuid'])
+        else:
+            verified, errors = conductor.verify_job(req_obj['job_uuid'])
+
         if verified is True:
             return response_ok()
 
@@ -106,6 +147,22 @@ def job_submit():
     return response_error()
 
 
+@app.route('/verifications')
+def verifications():
+    with conductor.lock:
+        return response_ok(dict(conductor.verification_results))
+
+
+@app.route('/verifications/<job_uuid>')
+def verification(job_uuid):
+    result = conductor.verification_results.get(job_uuid)
+
+    if result is None:
+        return response_error('Unknown job UUID')
+
+    return response_ok(result)
+
+
 @app.route('/job-reject', methods=('POST',))
 def job_reject():
     req_obj = request.get_json()
@@ -116,7 +173,7 @@ def job_reject():
         and req_obj.get('job_uuid') is not None
     ):
         # Remove the job from memory, consumer doesn't want it
-        conductor.del_job(req_obj['job_uuid'])
+        conductor.reject_job(req_obj['job_uuid'])
 
         if 'reason' in req_obj:
             # TODO: Do something meaningful with this?
@@ -127,6 +184,16 @@ def job_reject():
     return response_error()
 
 
+def watermarks(value):
+    """ Parse "high,low" watermarks """
+    high, low = (int(x) for x in value.split(','))
+
+    if low > high:
+        raise ValueError('Low watermark {} is above high watermark {}'.format(low, high))
+
+    return (high, low)
+
+
 def init_flask():
     """ init the singleton here """
     global conductor, block_model, tx_model
@@ -136,7 +203,98 @@ def init_flask():
     if CONDUCTOR_BATCH_SIZE is not None:
         CONDUCTOR_BATCH_SIZE = int(CONDUCTOR_BATCH_SIZE)
 
-    conductor = Conductor(batch_size=CONDUCTOR_BATCH_SIZE)
+    CONDUCTOR_SNAPSHOT_INTERVAL = os.environ.get('CONDUCTOR_SNAPSHOT_INTERVAL')
+
+    if CONDUCTOR_SNAPSHOT_INTERVAL is not None:
+        CONDUCTOR_SNAPSHOT_INTERVAL = int(CONDUCTOR_SNAPSHOT_INTERVAL)
+
+    CONDUCTOR_JOB_LEASE = os.environ.get('CONDUCTOR_JOB_LEASE')
+
+    if CONDUCTOR_JOB_LEASE is not None:
+        CONDUCTOR_JOB_LEASE = int(CONDUCTOR_JOB_LEASE)
+
+    CONDUCTOR_VERIFY_WORKERS = os.environ.get('CONDUCTOR_VERIFY_WORKERS')
+
+    if CONDUCTOR_VERIFY_WORKERS is not None:
+        CONDUCTOR_VERIFY_WORKERS = int(CONDUCTOR_VERIFY_WORKERS)
+
+    CONDUCTOR_HEAD_INTERVAL = os.environ.get('CONDUCTOR_HEAD_INTERVAL')
+
+    if CONDUCTOR_HEAD_INTERVAL is not None:
+        CONDUCTOR_HEAD_INTERVAL = float(CONDUCTOR_HEAD_INTERVAL)
+
+    CONDUCTOR_TARGET_JOB_SECONDS = os.environ.get('CONDUCTOR_TARGET_JOB_SECONDS')
+
+    if CONDUCTOR_TARGET_JOB_SECONDS is not None:
+        CONDUCTOR_TARGET_JOB_SECONDS = float(CONDUCTOR_TARGET_JOB_SECONDS)
+
+    CONDUCTOR_MIN_BATCH_SIZE = os.environ.get('CONDUCTOR_MIN_BATCH_SIZE')
+
+    if CONDUCTOR_MIN_BATCH_SIZE is not None:
+        CONDUCTOR_MIN_BATCH_SIZE = int(CONDUCTOR_MIN_BATCH_SIZE)
+
+    CONDUCTOR_MAX_BATCH_SIZE = os.environ.get('CONDUCTOR_MAX_BATCH_SIZE')
+
+    if CONDUCTOR_MAX_BATCH_SIZE is not None:
+        CONDUCTOR_MAX_BATCH_SIZE = int(CONDUCTOR_MAX_BATCH_SIZE)
+
+    CONDUCTOR_TIP_BLOCKS = os.environ.get('CONDUCTOR_TIP_BLOCKS')
+
+    if CONDUCTOR_TIP_BLOCKS is not None:
+        CONDUCTOR_TIP_BLOCKS = int(CONDUCTOR_TIP_BLOCKS)
+
+    CONDUCTOR_TIP_WEIGHT = os.environ.get('CONDUCTOR_TIP_WEIGHT')
+
+    if CONDUCTOR_TIP_WEIGHT is not None:
+        CONDUCTOR_TIP_WEIGHT = int(CONDUCTOR_TIP_WEIGHT)
+
+    CONDUCTOR_BACKFILL_WEIGHT = os.environ.get('CONDUCTOR_BACKFILL_WEIGHT')
+
+    if CONDUCTOR_BACKFILL_WEIGHT is not None:
+        CONDUCTOR_BACKFILL_WEIGHT = int(CONDUCTOR_BACKFILL_WEIGHT)
+
+    CONDUCTOR_BACKLOG_INTERVAL = os.environ.get('CONDUCTOR_BACKLOG_INTERVAL')
+
+    if CONDUCTOR_BACKLOG_INTERVAL is not None:
+        CONDUCTOR_BACKLOG_INTERVAL = float(CONDUCTOR_BACKLOG_INTERVAL)
+
+    CONDUCTOR_PRIME_WATERMARKS = os.environ.get('CONDUCTOR_PRIME_WATERMARKS')
+
+    if CONDUCTOR_PRIME_WATERMARKS is not None:
+        CONDUCTOR_PRIME_WATERMARKS = watermarks(CONDUCTOR_PRIME_WATERMARKS)
+
+    CONDUCTOR_DETAIL_WATERMARKS = os.environ.get('CONDUCTOR_DETAIL_WATERMARKS')
+
+    if CONDUCTOR_DETAIL_WATERMARKS is not None:
+        CONDUCTOR_DETAIL_WATERMARKS = watermarks(CONDUCTOR_DETAIL_WATERMARKS)
+
+    CONDUCTOR_MAX_JOB_WAITERS = os.environ.get('CONDUCTOR_MAX_JOB_WAITERS')
+
+    if CONDUCTOR_MAX_JOB_WAITERS is not None:
+        CONDUCTOR_MAX_JOB_WAITERS = int(CONDUCTOR_MAX_JOB_WAITERS)
+
+    # Make sure the job table is up to date for the postgres job store
+    create_initial(DSN)
+
+    conductor = Conductor(
+        batch_size=CONDUCTOR_BATCH_SIZE,
+        snapshot_path=os.environ.get('CONDUCTOR_SNAPSHOT_PATH'),
+        snapshot_interval=CONDUCTOR_SNAPSHOT_INTERVAL,
+        job_lease=CONDUCTOR_JOB_LEASE,
+        verify_workers=CONDUCTOR_VERIFY_WORKERS,
+        job_store=os.environ.get('CONDUCTOR_JOB_STORE'),
+        head_interval=CONDUCTOR_HEAD_INTERVAL,
+        target_job_seconds=CONDUCTOR_TARGET_JOB_SECONDS,
+        min_batch_size=CONDUCTOR_MIN_BATCH_SIZE,
+        max_batch_size=CONDUCTOR_MAX_BATCH_SIZE,
+        tip_blocks=CONDUCTOR_TIP_BLOCKS,
+        tip_weight=CONDUCTOR_TIP_WEIGHT,
+        backfill_weight=CONDUCTOR_BACKFILL_WEIGHT,
+        backlog_interval=CONDUCTOR_BACKLOG_INTERVAL,
+        prime_watermarks=CONDUCTOR_PRIME_WATERMARKS,
+        detail_watermarks=CONDUCTOR_DETAIL_WATERMARKS,
+        max_job_waiters=CONDUCTOR_MAX_JOB_WAITERS,
+    )
     block_model = BlockModel(DSN)
     tx_model = TransactionModel(DSN)
 
@@ -146,4 +304,7 @@ def api():
     host = os.environ.get('CONDUCTOR_HOST', '127.0.0.1')
     port = os.environ.get('CONDUCTOR_PORT', 3205)
 
+    # Exit normally on SIGTERM so the conductor can snapshot on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     app.run(host=host, port=port)
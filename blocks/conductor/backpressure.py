@@ -0,0 +1,123 @@
+""" Hold back upstream stages while the stages after them are behind
+
+Each stage's backlog is the work waiting for its workers: missing blocks for
+BLOCK, unprimed blocks for TX_PRIME and dirty transactions for TX_DETAIL.  When
+a stage's backlog reaches its high watermark, no new jobs are handed to the
+stage feeding it until the backlog drains to its low watermark.
+"""
+import threading
+
+from typing import Callable, Dict, Optional, Tuple
+
+from blocks.config import LOGGER
+from blocks.enums import WorkerType
+
+# Seconds between backlog measurements
+DEFAULT_BACKLOG_INTERVAL = 30
+
+# (high, low) watermarks for unprimed blocks and dirty transactions.  Block
+# ingestion isn't held back unless asked, so it runs without priming workers.
+DEFAULT_PRIME_WATERMARKS = (0, 0)
+DEFAULT_DETAIL_WATERMARKS = (5000000, 2500000)
+
+# Backlogs are counted up to twice the high watermark, or this without one
+MAX_BACKLOG_COUNT = 1000000
+
+# The stage feeding each stage
+UPSTREAM = {
+    WorkerType.TX_PRIME: WorkerType.BLOCK,
+    WorkerType.TX_DETAIL: WorkerType.TX_PRIME,
+}
+
+log = LOGGER.getChild(__name__)
+
+
+class Stage:
+    """ A stage's backlog and the watermarks that throttle its upstream.  A
+    high watermark of 0 never throttles.
+    """
+
+    def __init__(self, measure: Callable[[int], int],
+                 watermarks: Tuple[int, int] = (0, 0)):
+        self.measure = measure
+        self.high, self.low = watermarks
+        self.backlog: Optional[int] = None
+        self.throttling = False
+
+    def update(self) -> bool:
+        """ Measure the backlog.  Returns whether throttling changed. """
+        throttling = self.throttling
+        self.backlog = self.measure(self.high * 2 if self.high else MAX_BACKLOG_COUNT)
+
+        if not self.high:
+            self.throttling = False
+        elif self.backlog >= self.high:
+            self.throttling = True
+        elif self.backlog <= self.low:
+            self.throttling = False
+
+        return throttling != self.throttling
+
+    def to_dict(self):
+        return {
+            'backlog': self.backlog,
+            'high_watermark': self.high,
+            'low_watermark': self.low,
+            'throttling_upstream': self.throttling,
+        }
+
+
+class Backpressure(threading.Thread):
+    """ Periodically measure each stage's backlog.  on_release is called when
+    a stage stops being throttled.
+    """
+
+    def __init__(self, stages: Dict[WorkerType, Stage], interval: float,
+                 on_release: Callable[[], None]):
+        super(Backpressure, self).__init__()
+        self.daemon = True
+        self.stages = stages
+        self.interval = interval
+        self.on_release = on_release
+        self.shutdown = threading.Event()
+
+    def throttled(self, worker_type: WorkerType) -> bool:
+        """ Whether new jobs for worker_type are being held back """
+        return any(
+            stage.throttling
+            for stage_type, stage in self.stages.items()
+            if UPSTREAM.get(stage_type) == worker_type
+        )
+
+    def update(self):
+        released = False
+
+        for worker_type, stage in self.stages.items():
+            if stage.update():
+                log.warning('{} backlog at {}, {} {}'.format(
+                    worker_type,
+                    stage.backlog,
+                    UPSTREAM.get(worker_type),
+                    'throttled' if stage.throttling else 'resumed',
+                ))
+                released = released or not stage.throttling
+
+        if released:
+            self.on_release()
+
+    def report(self):
+        """ Each stage's backlog by worker type """
+        return {
+            str(worker_type): stage.to_dict()
+            for worker_type, stage in self.stages.items()
+        }
+
+    def run(self):
+        while True:
+            try:
+                self.update()
+            except Exception:
+                log.exception('Failed to measure stage backlogs')
+
+            if self.shutdown.wait(self.interval):
+                break
@@ -1,15 +1,49 @@
 """ consumer.py is what stuffs the DB """
-import json
-from math import floor
+import heapq
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
 from uuid import uuid4
-from web3 import Web3, HTTPProvider
+from web3 import Web3
 
-from typing import Union, Optional, List, Tuple
+from typing import Optional, List, Tuple
 
 from blocks.config import DSN, JSONRPC_NODE, LOGGER
-from blocks.utils import del_listf
 from blocks.db import ConsumerModel, BlockModel, TransactionModel
 from blocks.enums import WorkerType
+from blocks.exceptions import TooManyWaiters
+from blocks.jobs import (  # noqa: F401
+    JSONSerialized,
+    Job,
+    BlockJob,
+    TransactionPrimingJob,
+    TransactionDetailJob,
+    JobType,
+)
+from blocks.jobqueue import JobQueue, check_job
+from blocks.conductor import snapshot
+from blocks.conductor.backpressure import (
+    DEFAULT_BACKLOG_INTERVAL,
+    DEFAULT_PRIME_WATERMARKS,
+    DEFAULT_DETAIL_WATERMARKS,
+    Backpressure,
+    Stage,
+)
+from blocks.conductor.headtracker import HeadTracker
+from blocks.conductor.lanes import (
+    TIP,
+    BACKFILL,
+    DEFAULT_TIP_BLOCKS,
+    DEFAULT_TIP_WEIGHT,
+    DEFAULT_BACKFILL_WEIGHT,
+    Lanes,
+)
+from blocks.conductor.sizing import BatchSizer
+from blocks.conductor.bitmap import Bitmap
+from blocks.conductor.ranges import RangeSet
+from blocks.session import PooledHTTPProvider
 
 # TODO: Make bigger batch sizes, reduce request load on conductor
 DEFAULT_BATCH_SIZE = 500
@@ -18,137 +52,278 @@ DEFAULT_BATCH_SIZE = 500
 # BATCH_SIZE / DIVISOR = TX_BATCH_SIZE
 TX_BATCH_DIVISOR = 100
 
-# The max amount of block numbers to load from the DB per single query
+# The span of block numbers scanned for gaps by a single query
 LOAD_BATCH_SIZE = 1000000
 
-log = LOGGER.getChild(__name__)
-
-
-class JSONSerialized:
-    def to_json(self):
-        return json.dumps(self.to_dict())
-
+# How long a job should take its consumer.  Job sizes are adjusted per
+# consumer to hit it, within the batch size bounds.  0 disables adjustment.
+DEFAULT_TARGET_JOB_SECONDS = 60
+DEFAULT_MIN_BATCH_SIZE = 50
+DEFAULT_MAX_BATCH_SIZE = 10000
 
-class BlockJob(JSONSerialized):
-    def __init__(self, consumer_uuid, block_numbers):
-        self.job_uuid = str(uuid4())
-        self.consumer_uuid = consumer_uuid
-        self.block_numbers = block_numbers
+# Seconds between conductor snapshots, if snapshots are enabled
+DEFAULT_SNAPSHOT_INTERVAL = 300
 
-    def to_dict(self):
-        return {
-            'job_uuid': str(self.job_uuid),
-            'consumer_uuid': str(self.consumer_uuid),
-            'block_numbers': self.block_numbers,
-        }
+# Seconds a job is leased to a consumer without a ping before it is reclaimed
+DEFAULT_JOB_LEASE = 600
 
+# Threads verifying jobs submitted in the background
+DEFAULT_VERIFY_WORKERS = 4
 
-class TransactionPrimingJob(JSONSerialized):
-    def __init__(self, consumer_uuid, block_numbers):
-        self.job_uuid = str(uuid4())
-        self.consumer_uuid = consumer_uuid
-        self.block_numbers = block_numbers
+# How many background verification results to keep around for inspection
+MAX_VERIFICATION_RESULTS = 1000
 
-    def to_dict(self):
-        return {
-            'job_uuid': str(self.job_uuid),
-            'consumer_uuid': str(self.consumer_uuid),
-            'block_numbers': self.block_numbers,
-        }
+# Seconds between checks of the node for a new chain head
+DEFAULT_HEAD_INTERVAL = 5
 
+# Longest a job request may be held open waiting for work, and how often a
+# held request rechecks for work it wasn't notified about, like jobs released
+# by other conductors or expired leases
+MAX_JOB_WAIT = 60
+JOB_WAIT_INTERVAL = 15
 
-class TransactionDetailJob(JSONSerialized):
-    def __init__(self, consumer_uuid, transactions):
-        self.job_uuid = str(uuid4())
-        self.consumer_uuid = consumer_uuid
-        self.transactions = transactions
+# Job requests held open at once.  Each holds a request thread, so this must
+# leave threads free for pings and submits.
+DEFAULT_MAX_JOB_WAITERS = 12
 
-    def to_dict(self):
-        return {
-            'job_uuid': str(self.job_uuid),
-            'consumer_uuid': str(self.consumer_uuid),
-            'transactions': self.transactions,
-        }
-
-
-JobType = Union[BlockJob, TransactionPrimingJob, TransactionDetailJob]
+log = LOGGER.getChild(__name__)
 
 
 class Conductor:
     """ Partition out the workload and provide jobs to workers """
 
-    def __init__(self, batch_size=None):
+    def __init__(self, batch_size=None, snapshot_path=None,
+                 snapshot_interval=None, job_lease=None, verify_workers=None,
+                 job_store=None, head_interval=None, target_job_seconds=None,
+                 min_batch_size=None, max_batch_size=None, tip_blocks=None,
+                 tip_weight=None, backfill_weight=None, backlog_interval=None,
+                 prime_watermarks=None, detail_watermarks=None,
+                 max_job_waiters=None):
         self.status = False
+        # Leases jobs being verified in the background with the postgres job
+        # store, so no other conductor reissues them meanwhile
+        self.uuid = str(uuid4())
+        # Guards job and block number state shared by request handlers and
+        # background verification
+        self.lock = threading.RLock()
+        # Notified when work may have become available for held job requests.
+        # The generation counts notifications, so a request can tell whether
+        # it missed one while it looked for work.
+        self.work_available = threading.Condition(self.lock)
+        self.work_generation = 0
+        self.max_job_waiters = (
+            DEFAULT_MAX_JOB_WAITERS if max_job_waiters is None else max_job_waiters
+        )
+        self.job_waiters = 0
         self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.job_lease = job_lease or DEFAULT_JOB_LEASE
+        self.sizer = BatchSizer(
+            (
+                DEFAULT_TARGET_JOB_SECONDS if target_job_seconds is None
+                else target_job_seconds
+            ),
+            self.batch_size,
+            min_batch_size or DEFAULT_MIN_BATCH_SIZE,
+            max_batch_size or DEFAULT_MAX_BATCH_SIZE,
+        )
+        self.snapshot_path = snapshot_path
+        # BLOCK jobs are split between the newest tip_blocks blocks and
+        # backfilling history
+        self.tip_blocks = tip_blocks or DEFAULT_TIP_BLOCKS
+        self.lanes = Lanes({
+            TIP: DEFAULT_TIP_WEIGHT if tip_weight is None else tip_weight,
+            BACKFILL: (
+                DEFAULT_BACKFILL_WEIGHT if backfill_weight is None
+                else backfill_weight
+            ),
+        })
+        self.snapshot_writer = None
+        self.head_tracker = None
         self.latest_in_db = 0
         self.latest_on_chain = -1
-        self.known_block_numbers = set()
-        self.selected_block_numbers = set()
-        self.known_transactions = set()
+        self.known_block_numbers = Bitmap()
+        self.selected_block_numbers = Bitmap()
+        # Block numbers below latest_on_chain neither known nor selected
+        self.missing_block_numbers = RangeSet()
         self.selected_transactions = set()
-        # self.known_primed_blocks = set()
+        # The last dirty transaction hash handed out, to continue from
+        self.dirty_cursor = None
         self.selected_blocks_to_prime = set()
-        self.jobs = []
+        # Jobs by job UUID, and the job UUID held by each consumer
+        self.jobs = {}
+        self.consumer_jobs = {}
+        # Heap of (lease expiry, job UUID).  Renewals push a new entry and
+        # stale ones are skipped when popped.
+        self.leases = []
+        # Background verification status by job UUID, oldest first
+        self.verification_results = OrderedDict()
+        self.verifier = ThreadPoolExecutor(
+            max_workers=verify_workers or DEFAULT_VERIFY_WORKERS
+        )
 
         self.consumer_model = ConsumerModel(DSN)
         self.block_model = BlockModel(DSN)
         self.tx_model = TransactionModel(DSN)
 
-        self.web3 = Web3(HTTPProvider(JSONRPC_NODE))
+        # With the postgres job store, jobs live in the job table instead of
+        # the in-memory state above and can be shared by many conductors.
+        self.queue = None
 
-        self.get_meta()
-
-        self.status = True
-
-    def _process_block_meta(self, block_meta):
-        if not block_meta or len(block_meta) < 1:
-            return
-
-        log.info('Processing block numbers from DB...')
-
-        blocknums = [b[0] for b in block_meta]
-        blocknums_primed = [b[0] for b in block_meta if b[1]]
+        if job_store == 'postgres':
+            self.queue = JobQueue(DSN, self.job_lease, self.lanes, self.tip_blocks)
+        elif job_store not in (None, 'memory'):
+            raise ValueError('Unknown job store: {}'.format(job_store))
 
-        self.known_block_numbers.update(blocknums)
-        # self.known_primed_blocks.update(blocknums_primed)
+        self.web3 = Web3(PooledHTTPProvider(JSONRPC_NODE))
 
-        loaded = len(blocknums)
-        loaded_primed = len(blocknums_primed)
+        self.get_meta()
 
-        log.debug('Loaded {} block numbers ({} primed)'.format(loaded, loaded_primed))
+        if self.snapshot_path and not self.queue:
+            self.snapshot_writer = snapshot.SnapshotWriter(
+                self,
+                snapshot_interval or DEFAULT_SNAPSHOT_INTERVAL,
+            )
+            self.snapshot_writer.start()
+            atexit.register(self.save_snapshot)
+
+        self.head_tracker = HeadTracker(
+            self.web3,
+            self.update_latest_on_chain,
+            head_interval or DEFAULT_HEAD_INTERVAL,
+            self.latest_on_chain,
+        )
+        self.head_tracker.start()
+
+        self.backpressure = Backpressure(
+            {
+                WorkerType.BLOCK: Stage(self.count_missing_blocks),
+                WorkerType.TX_PRIME: Stage(
+                    self.block_model.estimate_unprimed,
+                    prime_watermarks or DEFAULT_PRIME_WATERMARKS,
+                ),
+                WorkerType.TX_DETAIL: Stage(
+                    self.tx_model.estimate_dirty,
+                    detail_watermarks or DEFAULT_DETAIL_WATERMARKS,
+                ),
+            },
+            backlog_interval or DEFAULT_BACKLOG_INTERVAL,
+            self.notify_work,
+        )
+        self.backpressure.start()
 
-        return loaded > 0
+        self.status = True
 
     def get_meta(self):
         """ Populate some things we'll need later """
+        if self.queue:
+            # Nothing to track in memory but the chain head
+            self.latest_on_chain = self.web3.eth.blockNumber
+            return
+
         res = self.block_model.get_latest()
 
         if res:
             self.latest_in_db = res
-            self.latest_on_chain = self.web3.eth.blockNumber
+            latest_on_chain = self.web3.eth.blockNumber
+            start = 0
 
-            log.debug("Latest on chain: %s", self.latest_on_chain)
+            log.debug("Latest on chain: %s", latest_on_chain)
 
-            batches = int(self.latest_on_chain / LOAD_BATCH_SIZE) + 1
+            snap = snapshot.load(self.snapshot_path) if self.snapshot_path else None
 
-            for i in range(1, batches + 1):
-                end = i * LOAD_BATCH_SIZE
-                start = end - LOAD_BATCH_SIZE
+            if snap and snap.watermark <= latest_on_chain:
+                log.info('Warm start from snapshot at block {}'.format(snap.watermark))
+                self._reconcile_snapshot(snap)
+                start = snap.watermark
 
-                log.debug('Loading blocks {}-{}'.format(start, end))
+            log.info('Loading block ranges {}-{} from DB...'.format(
+                start,
+                latest_on_chain,
+            ))
 
-                block_meta = self.block_model.get_block_meta(
-                    start=start,
-                    end=end,
-                )
+            self._load_ranges(start, latest_on_chain)
 
-                if not self._process_block_meta(block_meta):
-                    break
+            self.latest_on_chain = latest_on_chain
+            self.missing_block_numbers = RangeSet(
+                self.known_block_numbers.ranges()
+            ).complement(0, latest_on_chain)
+
+            log.debug('{} block numbers missing in {} ranges'.format(
+                len(self.missing_block_numbers),
+                len(self.missing_block_numbers.starts),
+            ))
 
         else:
             log.debug("Nothing in DB")
             self.latest_in_db = 0
 
+    def _load_ranges(self, start: int, end: int):
+        """ Load known block state for [start, end) from the DB """
+        self.known_block_numbers.add_range(start, end)
+
+        for gap_start, gap_end in self.block_model.get_missing_ranges(
+            start=start,
+            end=end,
+            chunk_size=LOAD_BATCH_SIZE,
+        ):
+            self.known_block_numbers.discard_range(gap_start, gap_end)
+
+    def _reconcile_snapshot(self, snap: snapshot.Snapshot):
+        """ Adopt a snapshot, checking the DB only where it had gaps below its
+        watermark
+        """
+        self.known_block_numbers = snap.known
+
+        known = RangeSet(self.known_block_numbers.ranges())
+
+        for gap_start, gap_end in known.complement(0, snap.watermark).ranges():
+            for start, end in self.block_model.get_present_ranges(
+                start=gap_start,
+                end=gap_end,
+                chunk_size=LOAD_BATCH_SIZE,
+            ):
+                self.known_block_numbers.add_range(start, end)
+
+    def save_snapshot(self):
+        """ Write the known block state to disk """
+        if not self.snapshot_path or self.latest_on_chain < 0:
+            return
+
+        snapshot.save(self.snapshot_path, snapshot.Snapshot(
+            watermark=self.latest_on_chain,
+            known=self.known_block_numbers,
+        ))
+
+    def update_latest_on_chain(self, latest: int):
+        """ Move the chain head forward, adding the new blocks as missing """
+        with self.lock:
+            if latest <= self.latest_on_chain:
+                return
+
+            if not self.queue:
+                start = max(self.latest_on_chain, 0)
+                self.missing_block_numbers.add_range(start, latest)
+
+                for known_start, known_end in self.known_block_numbers.ranges(start):
+                    if known_start >= latest:
+                        break
+                    self.missing_block_numbers.discard_range(known_start, known_end)
+
+            # Only published once the missing blocks are in place
+            self.latest_on_chain = latest
+            self.notify_work()
+
+    def count_missing_blocks(self, limit: int) -> int:
+        """ Count blocks up to the chain head that aren't in the DB, stopping
+        at limit.  With the postgres job store this is an estimate.
+        """
+        if self.queue:
+            missing = self.latest_on_chain + 1 - self.block_model.estimate_count()
+        else:
+            missing = len(self.missing_block_numbers) + len(self.selected_block_numbers)
+
+        return max(min(missing, limit), 0)
+
     def add_consumer(self, type, name, host, port):
         """ Add a consumer to track """
 
@@ -169,6 +344,7 @@ class Conductor:
     def ping(self, uuid):
         assert uuid is not None
         self.consumer_model.ping(uuid)
+        self.renew_job(uuid)
         log.debug('Ping from consumer {}'.format(uuid))
 
     def remove_consumer(self, uuid):
@@ -176,66 +352,210 @@ class Conductor:
         log.debug('Dropping consumer {}'.format(uuid))
 
     def get_job(self, uuid):
-        """ Get an existing job for a client """
-        return next(
-            filter(
-                lambda job: job.consumer_uuid == uuid or job.job_uuid == uuid,
-                self.jobs
-            ),
-            None
-        )
+        """ Get an existing job by job UUID or the UUID of its consumer """
+        if self.queue:
+            return self.queue.get(uuid)
+
+        job = self.jobs.get(uuid)
+
+        if job is None and uuid in self.consumer_jobs:
+            job = self.jobs.get(self.consumer_jobs[uuid])
+
+        return job
+
+    def add_job(self, job: JobType):
+        """ Track a newly issued job and lease it to its consumer """
+        self.jobs[job.job_uuid] = job
+        self.consumer_jobs[job.consumer_uuid] = job.job_uuid
+        heapq.heappush(self.leases, (job.renew(self.job_lease), job.job_uuid))
+
+    def renew_job(self, uuid):
+        """ Extend the lease on a job """
+        if self.queue:
+            self.queue.renew(uuid)
+            return
+
+        with self.lock:
+            job = self.get_job(uuid)
+
+            if job and job.job_uuid not in self.verification_results:
+                heapq.heappush(self.leases, (job.renew(self.job_lease), job.job_uuid))
 
     def del_job(self, uuid):
-        """ Get an existing job for a client """
-        del_listf(
-            self.jobs,
-            lambda job: job.consumer_uuid == uuid or job.job_uuid == uuid,
+        """ Stop tracking a job """
+        job = self.get_job(uuid)
+
+        if job:
+            del self.jobs[job.job_uuid]
+
+            if self.consumer_jobs.get(job.consumer_uuid) == job.job_uuid:
+                del self.consumer_jobs[job.consumer_uuid]
+
+    def release_job(self, job: JobType):
+        """ Put a job's work back up for grabs """
+        if isinstance(job, BlockJob):
+            self.selected_block_numbers.difference_update(job.block_numbers)
+            for block_number in job.block_numbers:
+                if block_number not in self.known_block_numbers:
+                    self.missing_block_numbers.add(block_number)
+
+        elif isinstance(job, TransactionPrimingJob):
+            self.selected_blocks_to_prime.difference_update(job.block_numbers)
+
+        elif isinstance(job, TransactionDetailJob):
+            self.selected_transactions.difference_update(job.transactions)
+
+    def reject_job(self, job_uuid):
+        """ Drop a job and put its work back up for grabs """
+        self.sizer.cancel(job_uuid)
+
+        if self.queue:
+            self.queue.release(job_uuid)
+            self.notify_work()
+            return
+
+        with self.lock:
+            job = self.get_job(job_uuid)
+
+            if job:
+                self.release_job(job)
+                self.del_job(job.job_uuid)
+                self.notify_work()
+
+    def reclaim_expired_jobs(self):
+        """ Release jobs whose consumers stopped pinging before finishing """
+        now = monotonic()
+
+        while self.leases and self.leases[0][0] <= now:
+            _, job_uuid = heapq.heappop(self.leases)
+            job = self.jobs.get(job_uuid)
+
+            if job and job.lease_expires <= now:
+                log.warning('Lease on job {} for consumer {} expired'.format(
+                    job_uuid,
+                    job.consumer_uuid,
+                ))
+                self.reject_job(job_uuid)
+
+    def notify_work(self):
+        """ Wake held job requests to look for work """
+        with self.work_available:
+            self.work_generation += 1
+            self.work_available.notify_all()
+
+    def generate_job(self, worker_type: WorkerType, uuid: str,
+                     wait: float = 0) -> Optional[JobType]:
+        """ Figure out what needs doing and grab a chunk.  If there's nothing
+        to do, wait up to wait seconds to be notified of something coming up.
+        Raises TooManyWaiters if there's nothing to do and max_job_waiters
+        requests are already waiting.
+        """
+        deadline = monotonic() + min(wait, MAX_JOB_WAIT)
+        waiting = False
+
+        try:
+            while True:
+                with self.work_available:
+                    # Work announced after this is waited for below
+                    generation = self.work_generation
+
+                    if not self.queue:
+                        job = self._generate_job(worker_type, uuid)
+
+                # Claims go to the DB, so they don't hold up other requests
+                if self.queue:
+                    job = self._claim_job(worker_type, uuid)
+
+                remaining = deadline - monotonic()
+
+                if job is not None or remaining <= 0:
+                    return job
+
+                with self.work_available:
+                    if not waiting:
+                        if self.job_waiters >= self.max_job_waiters:
+                            raise TooManyWaiters(
+                                '{} job requests already waiting'.format(
+                                    self.job_waiters
+                                )
+                            )
+
+                        self.job_waiters += 1
+                        waiting = True
+
+                    if self.work_generation == generation:
+                        self.work_available.wait(min(remaining, JOB_WAIT_INTERVAL))
+
+        finally:
+            if waiting:
+                with self.lock:
+                    self.job_waiters -= 1
+
+    def _claim_job(self, worker_type: WorkerType,
+                   uuid: str) -> Optional[JobType]:
+        """ Claim a job from the postgres job store """
+        log.info('Claiming job for {} worker {}'.format(worker_type, uuid))
+
+        if self.backpressure.throttled(worker_type):
+            return self.queue.get_leased(worker_type, uuid)
+
+        job = self.queue.claim(
+            worker_type,
+            uuid,
+            self.batch_limit(worker_type, uuid),
+            self.latest_on_chain,
         )
 
-    def generate_job(self, worker_type: WorkerType,
-                     uuid: str) -> Optional[JobType]:
-        """ Figure out what needs doing and grab a chunk """
+        if job is not None:
+            self.sizer.start(job.job_uuid, (uuid, worker_type), job.item_count())
+
+        return job
+
+    def batch_limit(self, worker_type: WorkerType, uuid: str) -> int:
+        """ How many items to put in the consumer's next job """
+        return self.sizer.size(
+            (uuid, worker_type),
+            TX_BATCH_DIVISOR if worker_type == WorkerType.TX_PRIME else 1,
+        )
 
+    def _generate_job(self, worker_type: WorkerType,
+                      uuid: str) -> Optional[JobType]:
         log.info('Generating job for {} worker {}'.format(worker_type, uuid))
 
+        self.reclaim_expired_jobs()
+
         existing_job = self.get_job(uuid)
 
         if existing_job:
             return existing_job
 
+        if self.backpressure.throttled(worker_type):
+            log.debug('Holding back {} jobs until downstream catches up'.format(
+                worker_type
+            ))
+            return None
+
         job: Optional[JobType]
+        limit = self.batch_limit(worker_type, uuid)
 
         if worker_type == WorkerType.BLOCK:
-            job = BlockJob(consumer_uuid=uuid, block_numbers=[])
-
-            for i in range(0, self.latest_on_chain):
-                if (
-                    i not in self.known_block_numbers
-                    and i not in self.selected_block_numbers
-                ):
-                    job.block_numbers.append(i)
-
-                if len(job.block_numbers) >= self.batch_size:
-                    break
+            job = BlockJob(
+                consumer_uuid=uuid,
+                block_numbers=self.take_missing_blocks(limit),
+            )
 
             if len(job.block_numbers) > 0:
                 self.selected_block_numbers.update(job.block_numbers)
             else:
-                # TODO: Don't make this request pointless.
-                self.latest_on_chain = self.web3.eth.blockNumber
-
-                log.warning(
-                    'No blocks available to add to job.  Updating to block '
-                    '{}'.format(
-                        self.latest_on_chain
-                    )
-                )
+                log.debug('No blocks available to add to job below block {}'.format(
+                    self.latest_on_chain
+                ))
 
         elif worker_type == WorkerType.TX_PRIME:
             job = TransactionPrimingJob(consumer_uuid=uuid, block_numbers=[])
 
             block_numbers = self.block_model.get_unprimed_blocks(
-                limit=floor(self.batch_size / TX_BATCH_DIVISOR),
+                limit=limit,
                 exclude=self.selected_blocks_to_prime,
             )
 
@@ -244,20 +564,17 @@ class Conductor:
             self.selected_blocks_to_prime.update(job.block_numbers)
 
         elif worker_type == WorkerType.TX_DETAIL:
-            job = TransactionDetailJob(consumer_uuid=uuid, transactions=[])
-
-            transaction_pool = self.tx_model.get_random_dirty(
-                limit=self.batch_size * 2
+            job = TransactionDetailJob(
+                consumer_uuid=uuid,
+                transactions=self.tx_model.get_next_dirty(
+                    limit=limit,
+                    after=self.dirty_cursor,
+                    exclude=self.selected_transactions,
+                ),
             )
 
-            job.transactions = [
-                tx.to_dict().get('hash')
-                for tx in transaction_pool
-                if (
-                    tx not in self.known_transactions
-                    and tx not in self.selected_transactions
-                )
-            ]
+            if job.transactions:
+                self.dirty_cursor = job.transactions[-1]
 
             self.selected_transactions.update(job.transactions)
 
@@ -265,10 +582,64 @@ class Conductor:
             log.warning('Unknown worker type')
             return None
 
-        self.jobs.append(job)
+        if job.is_empty():
+            return None
+
+        self.add_job(job)
+        self.sizer.start(job.job_uuid, (uuid, worker_type), job.item_count())
 
         return job
 
+    def take_missing_blocks(self, limit: int) -> List[int]:
+        """ Take missing block numbers for a job from the first lane that has
+        any.  The tip lane takes the newest missing blocks, the backfill lane
+        the oldest.
+        """
+        tip_floor = max(self.latest_on_chain - self.tip_blocks, 0)
+
+        for lane in self.lanes.order():
+            if lane == TIP:
+                block_numbers = self.missing_block_numbers.take_highest(
+                    limit,
+                    tip_floor,
+                )
+            else:
+                block_numbers = self.missing_block_numbers.take(limit)
+
+            if block_numbers:
+                self.lanes.record(lane)
+                return block_numbers
+
+        return []
+
+    def check_job(self, job: JobType) -> Tuple[bool, List[str]]:
+        """ Check the DB to see if a job's work has been done """
+        return check_job(job, self.block_model, self.tx_model)
+
+    def complete_job(self, job: JobType):
+        """ Record a verified job's work as done and stop tracking it """
+        if self.queue:
+            self.queue.complete(job.job_uuid)
+            self.notify_work()
+            return
+
+        with self.lock:
+            if isinstance(job, BlockJob):
+                self.known_block_numbers.update(job.block_numbers)
+                self.selected_block_numbers.difference_update(job.block_numbers)
+
+            elif isinstance(job, TransactionPrimingJob):
+                # So our exlusion list doesn't grow infinitely
+                self.selected_blocks_to_prime.difference_update(job.block_numbers)
+
+            elif isinstance(job, TransactionDetailJob):
+                self.selected_transactions.difference_update(job.transactions)
+
+            self.del_job(job.job_uuid)
+
+            # Finished work at one stage is new work for the next
+            self.notify_work()
+
     def verify_job(self, job_uuid) -> Tuple[bool, List[str]]:
         """ Verify that a job has bee completed """
         job = self.get_job(job_uuid)
@@ -276,62 +647,79 @@ class Conductor:
         if not job:
             return (False, ["Invalid job UUID"])
 
-        if isinstance(job, BlockJob):
-            log.debug('{}: Verifying block job...'.format(job_uuid))
+        self.sizer.finish(job.job_uuid)
 
-            for block_number in job.block_numbers:
-                valid, errors = self.block_model.validate_block(block_number)
-                if valid is not True:
-                    log.warning('verify of block {} failed'.format(block_number))
-                    return (valid, errors)
+        valid, errors = self.check_job(job)
 
-        elif isinstance(job, TransactionPrimingJob):
-            log.debug('{}: Verifying transcation priming job...'.format(job_uuid))
+        if valid is not True:
+            return (valid, errors)
 
-            if not job.block_numbers:
-                log.error(
-                    '{}: Job missing block numbers, probably an error'.format(
-                        job_uuid
-                    )
-                )
-                return (False, ["Job missing block numbers"])
+        self.complete_job(job)
 
-            for block_no in job.block_numbers:
-                valid, errors = self.block_model.validate_block_primed(
-                    block_no
-                )
+        log.debug('{}: Verification succeeded!'.format(job_uuid))
 
-                if valid is not True:
-                    return (valid, errors)
+        return (True, [])
 
-            # So our exlusion list doesn't grow infinitely, move blocks from
-            # selected to known.
-            # self.known_primed_blocks.update(job.block_numbers)
-            self.selected_blocks_to_prime.difference_update(job.block_numbers)
+    def submit_job(self, job_uuid) -> Tuple[bool, List[str]]:
+        """ Accept a job as finished and verify it in the background.  The
+        consumer is free to take another job straight away.  If verification
+        fails, the job's work goes back up for grabs.
+        """
+        with self.lock:
+            job = self.get_job(job_uuid)
 
-        elif isinstance(job, TransactionDetailJob):
-            log.debug('{}: Verifying transcation job...'.format(job_uuid))
+            if not job or job.job_uuid in self.verification_results:
+                return (False, ["Invalid job UUID"])
 
-            if not job.transactions:
-                log.error(
-                    '{}: Job missing transactions, probably an error'.format(
-                        job_uuid
-                    )
-                )
-                return (False, ["Job missing transactions"])
+            self.sizer.finish(job.job_uuid)
 
-            for tx_hash in job.transactions:
-                valid, errors = self.tx_model.validate_transaction(tx_hash)
+            # Free the consumer up for a new job and keep the lease from
+            # expiring while verification is queued
+            if self.queue:
+                self.queue.hold(job.job_uuid, self.uuid)
 
-                if valid is not True:
-                    return (valid, errors)
+            elif self.consumer_jobs.get(job.consumer_uuid) == job.job_uuid:
+                del self.consumer_jobs[job.consumer_uuid]
 
-        else:
-            log.warning('{}: Unknown job type'.format(job_uuid))
-            return (False, ["Unknown job type"])
+            job.lease_expires = float('inf')
 
-        self.del_job(job_uuid)
+            self.set_verification_result(job.job_uuid, 'pending')
 
-        log.debug('{}: Verification succeeded!'.format(job_uuid))
+        self.verifier.submit(self._verify_in_background, job)
 
         return (True, [])
+
+    def _verify_in_background(self, job: JobType):
+        # Keep the leases on jobs still waiting for verification alive
+        if self.queue:
+            self.queue.renew(self.uuid)
+
+        try:
+            valid, errors = self.check_job(job)
+        except Exception as err:
+            log.exception('{}: Verification errored'.format(job.job_uuid))
+            valid, errors = (False, [str(err)])
+
+        if valid is True:
+            self.complete_job(job)
+            self.set_verification_result(job.job_uuid, 'verified')
+            log.debug('{}: Verification succeeded!'.format(job.job_uuid))
+        else:
+            log.warning('{}: Verification failed, requeueing: {}'.format(
+                job.job_uuid,
+                ', '.join(errors),
+            ))
+
+            self.reject_job(job.job_uuid)
+            self.set_verification_result(job.job_uuid, 'failed', errors)
+
+    def set_verification_result(self, job_uuid, status, errors=None):
+        with self.lock:
+            self.verification_results.pop(job_uuid, None)
+            self.verification_results[job_uuid] = {
+                'status': status,
+                'errors': errors or [],
+            }
+
+            while len(self.verification_results) > MAX_VERIFICATION_RESULTS:
+                self.verification_results.popitem(last=False)
@@ -0,0 +1,39 @@
+""" Follow the chain head in the background """
+import threading
+
+from typing import Callable
+
+from web3 import Web3
+
+from blocks.config import LOGGER
+
+log = LOGGER.getChild(__name__)
+
+
+class HeadTracker(threading.Thread):
+    """ Poll the node for the latest block number and hand it to publish
+    whenever it moves, so nothing handing out jobs waits on the node.
+    """
+
+    def __init__(self, web3: Web3, publish: Callable[[int], None],
+                 interval: float, latest: int = -1):
+        super(HeadTracker, self).__init__()
+        self.daemon = True
+        self.web3 = web3
+        self.publish = publish
+        self.interval = interval
+        self.latest = latest
+        self.shutdown = threading.Event()
+
+    def run(self):
+        while not self.shutdown.wait(self.interval):
+            try:
+                latest = self.web3.eth.blockNumber
+
+                if latest > self.latest:
+                    log.debug('Chain head moved to {}'.format(latest))
+                    self.publish(latest)
+                    self.latest = latest
+
+            except Exception:
+                log.exception('Failed to update the chain head')
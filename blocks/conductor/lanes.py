@@ -0,0 +1,50 @@
+""" Share block work between following the chain head and backfilling """
+import threading
+from collections import deque
+
+from typing import Dict, List
+
+# Lane for the newest blocks on chain
+TIP = 'tip'
+# Lane sweeping up history from the oldest missing block
+BACKFILL = 'backfill'
+
+# How many of the newest blocks the tip lane covers
+DEFAULT_TIP_BLOCKS = 1000
+
+# Relative shares of BLOCK jobs for each lane
+DEFAULT_TIP_WEIGHT = 1
+DEFAULT_BACKFILL_WEIGHT = 1
+
+# How many recent jobs lane shares are measured over
+WINDOW = 100
+
+
+class Lanes:
+    """ Split jobs between lanes in proportion to their weights.  Lanes are
+    tried in order of how far they are below their share of recent jobs, so a
+    lane with no work doesn't hold the others up and doesn't build up a debt
+    while idle.  Lanes with a weight of 0 are never used.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = {lane: weight for lane, weight in weights.items() if weight > 0}
+
+        if not self.weights:
+            raise ValueError('At least one lane needs a weight above 0')
+
+        self.recent: deque = deque(maxlen=WINDOW)
+        self.lock = threading.Lock()
+
+    def order(self) -> List[str]:
+        """ Get the lanes in the order they should be tried """
+        with self.lock:
+            return sorted(
+                self.weights,
+                key=lambda lane: (self.recent.count(lane) + 1) / self.weights[lane],
+            )
+
+    def record(self, lane: str):
+        """ Count a job handed out from lane """
+        with self.lock:
+            self.recent.append(lane)
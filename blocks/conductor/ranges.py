@@ -0,0 +1,154 @@
+""" Sorted sets of integer ranges """
+from bisect import bisect_left, bisect_right
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+class RangeSet:
+    """ A set of integers stored as sorted, disjoint, half-open ranges of
+    [start, end).  Membership and updates are a bisect over the number of
+    ranges, not the number of integers they hold.
+    """
+
+    def __init__(self, ranges: Optional[Iterable[Tuple[int, int]]] = None):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.size = 0
+
+        if ranges:
+            for start, end in ranges:
+                self.add_range(start, end)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __contains__(self, n: int) -> bool:
+        i = bisect_right(self.starts, n) - 1
+        return i >= 0 and n < self.ends[i]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self.ranges():
+            yield from range(start, end)
+
+    def ranges(self) -> Iterator[Tuple[int, int]]:
+        """ Iterate the [start, end) ranges in ascending order """
+        return zip(self.starts, self.ends)
+
+    def add(self, n: int):
+        self.add_range(n, n + 1)
+
+    def discard(self, n: int):
+        self.discard_range(n, n + 1)
+
+    def update(self, numbers: Iterable[int]):
+        for n in numbers:
+            self.add(n)
+
+    def difference_update(self, numbers: Iterable[int]):
+        for n in numbers:
+            self.discard(n)
+
+    def add_range(self, start: int, end: int):
+        """ Add [start, end), merging with any touching ranges """
+        if start >= end:
+            return
+
+        # Ranges i..j-1 overlap or are adjacent to the new one
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+
+        if i < j:
+            self.size -= sum(
+                e - s for s, e in zip(self.starts[i:j], self.ends[i:j])
+            )
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+        self.size += end - start
+
+    def discard_range(self, start: int, end: int):
+        """ Remove [start, end), splitting any range it cuts through """
+        if start >= end:
+            return
+
+        # Ranges i..j-1 overlap the removed one
+        i = bisect_right(self.ends, start)
+        j = bisect_left(self.starts, end)
+
+        if i >= j:
+            return
+
+        new_starts = []
+        new_ends = []
+
+        if self.starts[i] < start:
+            new_starts.append(self.starts[i])
+            new_ends.append(start)
+
+        if self.ends[j - 1] > end:
+            new_starts.append(end)
+            new_ends.append(self.ends[j - 1])
+
+        self.size -= sum(
+            e - s for s, e in zip(self.starts[i:j], self.ends[i:j])
+        )
+        self.size += sum(e - s for s, e in zip(new_starts, new_ends))
+
+        self.starts[i:j] = new_starts
+        self.ends[i:j] = new_ends
+
+    def complement(self, start: int, end: int) -> 'RangeSet':
+        """ Get everything in [start, end) that is not in this set """
+        rset = RangeSet()
+        cursor = start
+
+        for s, e in self.ranges():
+            if e <= cursor:
+                continue
+            if s >= end:
+                break
+            if s > cursor:
+                rset.starts.append(cursor)
+                rset.ends.append(s)
+                rset.size += s - cursor
+            cursor = max(cursor, e)
+
+        if cursor < end:
+            rset.starts.append(cursor)
+            rset.ends.append(end)
+            rset.size += end - cursor
+
+        return rset
+
+    def take(self, limit: int) -> List[int]:
+        """ Remove and return up to limit of the lowest integers """
+        taken: List[int] = []
+
+        while self.starts and len(taken) < limit:
+            start = self.starts[0]
+            end = min(self.ends[0], start + limit - len(taken))
+
+            taken.extend(range(start, end))
+            self.discard_range(start, end)
+
+        return taken
+
+    def take_highest(self, limit: int, floor: int = 0) -> List[int]:
+        """ Remove and return up to limit of the highest integers no lower
+        than floor, in ascending order
+        """
+        taken: List[int] = []
+
+        while self.ends and len(taken) < limit and self.ends[-1] > floor:
+            end = self.ends[-1]
+            start = max(self.starts[-1], floor, end - (limit - len(taken)))
+
+            taken[:0] = range(start, end)
+            self.discard_range(start, end)
+
+        return taken
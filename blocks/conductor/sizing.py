@@ -0,0 +1,107 @@
+""" Size each consumer's jobs by how fast it has been getting through them """
+import threading
+from collections import OrderedDict
+from math import floor
+from time import monotonic
+
+from typing import Hashable, Tuple
+
+from blocks.config import LOGGER
+
+# Weight given to the newest measurement of a consumer's speed
+SMOOTHING = 0.5
+
+# Most a consumer's job size may grow from one job to the next
+MAX_GROWTH = 2
+
+# How many consumers and open jobs to remember
+MAX_TRACKED = 10000
+
+log = LOGGER.getChild(__name__)
+
+
+class BatchSizer:
+    """ Track how long each consumer takes per item and pick job sizes that
+    should take it about target_seconds, between min_size and max_size.  With
+    no target, or before a consumer has finished a job, jobs get default_size.
+    """
+
+    def __init__(self, target_seconds: float, default_size: int, min_size: int,
+                 max_size: int):
+        self.target_seconds = target_seconds
+        self.default_size = default_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Smoothed seconds per item and last size handed out, by key
+        self.rates: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self.sizes: 'OrderedDict[Hashable, int]' = OrderedDict()
+        # (key, items, start time) by job UUID for jobs being worked on
+        self.started: 'OrderedDict[str, Tuple[Hashable, int, float]]' = OrderedDict()
+
+    def size(self, key: Hashable, divisor: int = 1) -> int:
+        """ Get the number of items for key's next job.  The default and
+        bounds are divided by divisor, for work measured in bigger items.
+        """
+        default = max(1, floor(self.default_size / divisor))
+
+        with self.lock:
+            rate = self.rates.get(key)
+
+            if not self.target_seconds or rate is None:
+                return default
+
+            min_size = max(1, floor(self.min_size / divisor))
+            max_size = max(min_size, floor(self.max_size / divisor))
+
+            size = floor(self.target_seconds / rate) if rate > 0 else max_size
+            size = min(size, self.sizes.get(key, default) * MAX_GROWTH)
+
+            return max(min_size, min(size, max_size))
+
+    def start(self, job_uuid: str, key: Hashable, items: int):
+        """ Start timing a job of items for key """
+        with self.lock:
+            if job_uuid in self.started:
+                return
+
+            self.started[job_uuid] = (key, items, monotonic())
+            self._remember(self.sizes, key, items)
+
+            while len(self.started) > MAX_TRACKED:
+                self.started.popitem(last=False)
+
+    def finish(self, job_uuid: str):
+        """ Stop timing a job and fold its speed into its key's rate """
+        with self.lock:
+            started = self.started.pop(job_uuid, None)
+
+            if started is None:
+                return
+
+            key, items, start_time = started
+
+            if items < 1:
+                return
+
+            rate = (monotonic() - start_time) / items
+            previous = self.rates.get(key)
+
+            if previous is not None:
+                rate = SMOOTHING * rate + (1 - SMOOTHING) * previous
+
+            self._remember(self.rates, key, rate)
+
+            log.debug('{} taking {:.3f}s per item'.format(key, rate))
+
+    def cancel(self, job_uuid: str):
+        """ Stop timing a job that was not finished """
+        with self.lock:
+            self.started.pop(job_uuid, None)
+
+    def _remember(self, values, key, value):
+        values.pop(key, None)
+        values[key] = value
+
+        while len(values) > MAX_TRACKED:
+            values.popitem(last=False)
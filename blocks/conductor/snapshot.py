@@ -0,0 +1,81 @@
+""" On-disk snapshots of the conductor's view of the chain
+
+A snapshot is a fixed header followed by the raw known block bitmap:
+
+    magic(8) | watermark(8) | known length(8) | known
+
+The watermark is the chain head the snapshot was taken at.  Everything below
+it only needs to be reconciled where the snapshot had gaps.  Which blocks are
+primed is not kept; priming jobs are picked from the DB.
+"""
+import os
+import struct
+import threading
+
+from typing import NamedTuple, Optional
+
+from blocks.config import LOGGER
+from blocks.conductor.bitmap import Bitmap
+
+MAGIC = b'BLKSNAP2'
+HEADER = struct.Struct('<8sqQ')
+
+log = LOGGER.getChild(__name__)
+
+
+class Snapshot(NamedTuple):
+    watermark: int
+    known: Bitmap
+
+
+def save(path: str, snapshot: Snapshot):
+    """ Atomically write a snapshot to path """
+    known_bits = bytes(snapshot.known.bits)
+    tmp_path = '{}.tmp'.format(path)
+
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, snapshot.watermark, len(known_bits)))
+        snapshot_file.write(known_bits)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+
+    os.replace(tmp_path, path)
+
+    log.debug('Wrote snapshot at block {} to {}'.format(snapshot.watermark, path))
+
+
+def load(path: str) -> Optional[Snapshot]:
+    """ Read a snapshot from path into memory.  Returns None if there is no
+    usable snapshot.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) < HEADER.size:
+        return None
+
+    with open(path, 'rb') as snapshot_file:
+        data = snapshot_file.read()
+
+    magic, watermark, known_len = HEADER.unpack_from(data)
+
+    if magic != MAGIC or len(data) != HEADER.size + known_len:
+        log.warning('Ignoring invalid snapshot {}'.format(path))
+        return None
+
+    return Snapshot(watermark=watermark, known=Bitmap(data[HEADER.size:]))
+
+
+class SnapshotWriter(threading.Thread):
+    """ Periodically snapshot a conductor """
+
+    def __init__(self, conductor, interval: int):
+        super(SnapshotWriter, self).__init__()
+        self.daemon = True
+        self.conductor = conductor
+        self.interval = interval
+        self.shutdown = threading.Event()
+
+    def run(self):
+        while not self.shutdown.wait(self.interval):
+            try:
+                self.conductor.save_snapshot()
+            except OSError:
+                log.exception('Failed to write conductor snapshot')
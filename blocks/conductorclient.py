@@ -1,15 +1,35 @@
 import os
 import json
-import requests
-from requests.exceptions import ConnectionError  # noqa: F401
+from requests.exceptions import ConnectionError, Timeout  # noqa: F401
 from urllib.parse import urljoin
 
+from blocks.config import HTTP_TIMEOUT
+from blocks.encoding import JSON_TYPE, MSGPACK_TYPE, decode_job, unpack
+from blocks.session import get_session
+
 CONDUCTOR_BASE_URL = os.environ.get('CONDUCTOR_ENDPOINT', 'http://localhost:3205')
 
+# Have the conductor acknowledge submitted jobs and verify them in the background
+BACKGROUND_SUBMIT = os.environ.get('CONDUCTOR_BACKGROUND_SUBMIT', '').lower() in ('1', 'true')
+
+# Seconds the conductor may hold a job request open waiting for work
+JOB_WAIT = float(os.environ.get('CONDUCTOR_JOB_WAIT', 30))
+
+# How jobs are sent to us: json, compact (block number ranges) or msgpack
+# (compact, with raw transaction hashes)
+JOB_ENCODING = os.environ.get('CONDUCTOR_JOB_ENCODING', 'compact').lower()
+
+# Seconds to wait on the conductor beyond the time it was asked to hold a request
+JOB_WAIT_GRACE = 10
+
 
 def get(endpoint):
     url = urljoin(CONDUCTOR_BASE_URL, endpoint)
-    r = requests.get(url)
+
+    try:
+        r = get_session().get(url, timeout=HTTP_TIMEOUT)
+    except Timeout as err:
+        raise ConnectionError(err)
 
     if r.status_code != 200:
         raise Exception('Request failed ({})'.format(r.status_code))
@@ -17,17 +37,25 @@ def get(endpoint):
     return r.json()
 
 
-def post(endpoint, data):
+def post(endpoint, data, timeout=HTTP_TIMEOUT, accept=JSON_TYPE):
     url = urljoin(CONDUCTOR_BASE_URL, endpoint)
-    r = requests.post(
-        url,
-        headers={'Content-Type': 'application/json'},
-        data=json.dumps(data)
-    )
+
+    try:
+        r = get_session().post(
+            url,
+            headers={'Content-Type': JSON_TYPE, 'Accept': accept},
+            data=json.dumps(data),
+            timeout=timeout
+        )
+    except Timeout as err:
+        raise ConnectionError(err)
 
     if r.status_code != 200:
         raise Exception('Request failed ({})'.format(r.status_code))
 
+    if r.headers.get('Content-Type', '').startswith(MSGPACK_TYPE):
+        return unpack(r.content)
+
     return r.json()
 
 
@@ -35,12 +63,30 @@ def ping(uuid):
     return post('/ping', data={'uuid': uuid})
 
 
-def job_request(uuid, worker_type):
-    return post('/job-request', data={'uuid': uuid, 'type': str(worker_type)})
+def job_request(uuid, worker_type, wait=JOB_WAIT):
+    """ Request a job.  The conductor holds the request for up to wait
+    seconds if it has no work, then responds with no job data.
+    """
+    res = post(
+        '/job-request',
+        data={
+            'uuid': uuid,
+            'type': str(worker_type),
+            'wait': wait,
+            'compact': JOB_ENCODING != 'json',
+        },
+        timeout=wait + JOB_WAIT_GRACE,
+        accept=MSGPACK_TYPE if JOB_ENCODING == 'msgpack' else JSON_TYPE
+    )
+
+    if res.get('success') and res.get('data'):
+        res['data'] = decode_job(res['data'])
+
+    return res
 
 
-def job_submit(job_uuid):
-    return post('/job-submit', data={'job_uuid': job_uuid})
+def job_submit(job_uuid, background=BACKGROUND_SUBMIT):
+    return post('/job-submit', data={'job_uuid': job_uuid, 'background': background})
 
 
 def job_reject(job_uuid, reason="Rejected"):
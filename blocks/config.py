@@ -21,11 +21,23 @@ name = blocks
 
 [ethereum]
 node = http://localhost:8545/
+batch_size = 100
+concurrency = 4
+
+[http]
+pool_size = 20
+timeout = 120
+gzip = true
 
 Or env vars:
 
 LOG_LEVEL
 JSONRPC_NODE
+JSONRPC_BATCH_SIZE
+JSONRPC_CONCURRENCY
+HTTP_POOL_SIZE
+HTTP_TIMEOUT
+HTTP_GZIP
 PGUSER
 PGPASSWORD
 PGHOST
@@ -120,3 +132,23 @@ Set the Ethereum JSON-RPC node endpoint
 
 """
 JSONRPC_NODE = env_or_ini('JSONRPC_NODE', CONFIG, 'ethereum', 'node', 'http://localhost:8545/')
+
+# Calls per JSON-RPC batch request.  1 turns batching off.
+JSONRPC_BATCH_SIZE = int(env_or_ini('JSONRPC_BATCH_SIZE', CONFIG, 'ethereum', 'batch_size', 100))
+
+# Requests each worker keeps in flight to the node while it writes to the DB
+JSONRPC_CONCURRENCY = int(env_or_ini('JSONRPC_CONCURRENCY', CONFIG, 'ethereum', 'concurrency', 4))
+
+"""
+
+HTTP connections to the node and the conductor
+
+"""
+# Keep-alive connections kept open to each host
+HTTP_POOL_SIZE = int(env_or_ini('HTTP_POOL_SIZE', CONFIG, 'http', 'pool_size', 20))
+
+# Seconds to wait on a request before giving up
+HTTP_TIMEOUT = float(env_or_ini('HTTP_TIMEOUT', CONFIG, 'http', 'timeout', 120))
+
+# Ask for gzipped responses.  requests does by default; false turns it off.
+HTTP_GZIP = str(env_or_ini('HTTP_GZIP', CONFIG, 'http', 'gzip', 'true')).lower() in ('1', 'true')
@@ -1,13 +1,17 @@
 """ Database models and utilities """
+import io
 import os
+import csv
 import sys
+import re
 import random
 import psycopg2
+from time import sleep
 from datetime import datetime
 from eth_utils.address import is_address
 from rawl import RawlBase
 
-from typing import List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from blocks.utils import is_256bit_hash, validate_conditions
 from blocks.config import LOGGER
@@ -17,6 +21,168 @@ log = LOGGER.getChild('db')
 
 MAX_LOCKS = 50
 
+# Session advisory lock key serializing schema upgrades between processes,
+# and seconds between attempts to take it
+UPGRADE_LOCK = 320500
+UPGRADE_POLL_INTERVAL = 1
+
+# Rows to write, as dicts of column values
+Rows = List[Dict[str, Any]]
+
+# SQL equivalents of is_256bit_hash() and the shape check of is_address()
+HASH_PATTERN = "'^(0x)?[0-9a-fA-F]{{64}}$'"
+ADDRESS_PATTERN = "'^0x[0-9a-fA-F]{{40}}$'"
+
+BLOCK_CHECKS = [
+    ("t.block_timestamp IS NOT NULL", "block_timestamp is missing"),
+    ("t.difficulty IS NOT NULL", "difficulty missing"),
+    ("t.hash IS NOT NULL", "block hash missing"),
+    ("t.hash ~ " + HASH_PATTERN, "block hash is not a hash"),
+    ("t.miner IS NOT NULL", "miner missing"),
+    ("t.miner ~ " + ADDRESS_PATTERN, "miner is not an address"),
+    ("t.gas_used IS NOT NULL", "gas_used missing"),
+    ("t.gas_limit IS NOT NULL", "gas_limit missing"),
+    ("t.nonce IS NOT NULL", "nonce missing"),
+    ("t.size IS NOT NULL", "size missing"),
+]
+
+BLOCK_PRIMED_CHECKS = [
+    ("t.primed", "Not marked primed"),
+]
+
+TRANSACTION_CHECKS = [
+    ("t.hash ~ " + HASH_PATTERN, "Transaction hash is invalid"),
+    ("t.dirty = false", "Transaction is marked dirty"),
+    ("t.block_number IS NOT NULL", "block_number missing"),
+    ("t.from_address ~ " + ADDRESS_PATTERN, "from_address is not an address"),
+    ("t.to_address ~ " + ADDRESS_PATTERN, "to_address is not an address"),
+    ("t.value IS NOT NULL", "value missing"),
+    ("t.gas_price IS NOT NULL", "gas_price missing"),
+    ("t.gas_limit IS NOT NULL", "gas_limit missing"),
+    ("t.nonce IS NOT NULL", "nonce missing"),
+    ("t.input IS NOT NULL", "input missing"),
+]
+
+
+def bulk_validate(model: RawlBase, pk_type: str, keys: Iterable[Any],
+                  missing_error: str,
+                  checks: List[Tuple[str, str]]) -> Dict[Any, List[str]]:
+    """ Validate many rows of a model's table in one query.  checks are SQL
+    conditions on the row aliased as t, paired with the error to report when
+    they do not hold.  Returns the errors for every key that failed.
+    """
+    keys = list(keys)
+
+    if not keys:
+        return {}
+
+    columns = ['key', 'found'] + ['check_{}'.format(i) for i in range(len(checks))]
+
+    res = model.query(
+        "SELECT k.key, t." + model.pk + " IS NOT NULL, "
+        + ", ".join("coalesce(" + cond + ", false)" for cond, _ in checks) +
+        " FROM unnest({}::" + pk_type + "[]) AS k(key)"
+        " LEFT JOIN " + model.table + " AS t ON t." + model.pk + " = k.key;",
+        keys,
+        columns=columns
+    )
+
+    failures = {}
+
+    for row in res:
+        if row[1] is not True:
+            failures[row[0]] = [missing_error]
+            continue
+
+        valid, errors = validate_conditions([
+            (row[i + 2], error) for i, (_, error) in enumerate(checks)
+        ])
+
+        if not valid:
+            failures[row[0]] = errors
+
+    return failures
+
+
+def estimate_rows(model: RawlBase, relation: str) -> int:
+    """ Estimate the rows in a table or the entries in an index from the
+    planner's statistics, as of its last VACUUM or ANALYZE.  Nothing is
+    scanned, so it is cheap however big the relation is.
+    """
+    return model.query(
+        "SELECT greatest(reltuples, 0)::bigint FROM pg_class"
+        " WHERE oid = {}::regclass;",
+        relation
+    )[0][0]
+
+
+def stage_table(model: RawlBase, table: Optional[str] = None) -> str:
+    """ Create a temporary staging copy of table (by default the model's) for
+    COPYs inside the model's open transaction, if there isn't one already.
+    Returns the staging table's name.  The staging table lives as long as the
+    pooled connection and is emptied on commit or rollback.
+    """
+    table = table or model.table
+    staging = table + '_staging'
+
+    model.query(
+        "CREATE TEMPORARY TABLE IF NOT EXISTS " + staging +
+        " (LIKE " + table + " INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;"
+    )
+
+    return staging
+
+
+def copy_rows(model: RawlBase, staging: str, rows: Rows) -> List[str]:
+    """ COPY rows into a staging table, inside the model's open transaction.
+    Returns the columns copied, the keys of the first row.
+    """
+    columns = list(rows[0].keys())
+    buf = io.StringIO()
+
+    csv.writer(buf).writerows([row[column] for column in columns] for row in rows)
+    buf.seek(0)
+
+    with model._open_transaction.cursor() as curs:
+        curs.copy_expert(
+            "COPY " + staging + " (" + ", ".join(columns) + ")"
+            " FROM STDIN WITH (FORMAT csv);",
+            buf
+        )
+
+    return columns
+
+
+def insert_staged(model: RawlBase, table: str, columns: List[str],
+                  conflict: str, returning: str = "") -> list:
+    """ Insert everything COPYed to table's staging table into table """
+    return model.query(
+        "INSERT INTO " + table + " (" + ", ".join(columns) + ")"
+        " SELECT " + ", ".join(columns) + " FROM " + table + "_staging"
+        " " + conflict + " " + returning + ";"
+    )
+
+
+# Overwrite a primed or partly stored transaction with full details
+TRANSACTION_UPSERT = (
+    "ON CONFLICT (hash) DO UPDATE SET"
+    " dirty = EXCLUDED.dirty,"
+    " block_number = EXCLUDED.block_number,"
+    " from_address = EXCLUDED.from_address,"
+    " to_address = EXCLUDED.to_address,"
+    " value = EXCLUDED.value,"
+    " gas_price = EXCLUDED.gas_price,"
+    " gas_limit = EXCLUDED.gas_limit,"
+    " nonce = EXCLUDED.nonce,"
+    " input = EXCLUDED.input"
+)
+
+
+JOB_SELECT = (
+    "job_uuid, job_type, lease_owner, lower(block_range)::integer,"
+    " upper(block_range)::integer, block_numbers, transactions"
+)
+
 
 class ConsumerModel(RawlBase):
     def __init__(self, dsn: str):
@@ -40,14 +206,179 @@ class ConsumerModel(RawlBase):
 
 
 class JobModel(RawlBase):
+    # Columns returned for a job by JOB_SELECT
+    job_columns = ['job_uuid', 'job_type', 'lease_owner', 'range_start',
+                   'range_end', 'block_numbers', 'transactions']
+
     def __init__(self, dsn: str):
         super(JobModel, self).__init__(
             dsn,
             table_name='job',
-            columns=['job_id', 'blocks', 'trasnactions', 'block_range'],
+            columns=['job_id', 'blocks', 'trasnactions', 'block_range',
+                     'job_uuid', 'job_type', 'block_numbers', 'transactions',
+                     'lease_owner', 'lease_expires'],
             pk_name='job_id'
         )
 
+    def get_job(self, job_uuid):
+        """ Get a job by UUID """
+        res = self.query(
+            "SELECT " + JOB_SELECT + " FROM job WHERE job_uuid = {};",
+            job_uuid,
+            columns=self.job_columns
+        )
+
+        return res[0] if res else None
+
+    def get_leased(self, owner, job_type):
+        """ Get the unexpired job of a type leased to an owner """
+        res = self.query(
+            "SELECT " + JOB_SELECT + " FROM job"
+            " WHERE lease_owner = {} AND job_type = {}"
+            " AND lease_expires > now();",
+            owner,
+            job_type,
+            columns=self.job_columns
+        )
+
+        return res[0] if res else None
+
+    def claim(self, job_type, owner, lease_seconds, above=None):
+        """ Lease the oldest unleased or expired job of a type to owner.  Rows
+        already being claimed by another process are skipped, not waited on.
+        With above, only BLOCK jobs reaching past that block number are
+        claimed, newest first.
+        """
+        condition = "   ORDER BY job_id"
+        args = [owner, lease_seconds, job_type]
+
+        if above is not None:
+            condition = (
+                "   AND upper(block_range) > {3}"
+                "   ORDER BY upper(block_range) DESC"
+            )
+            args.append(above)
+
+        res = self.query(
+            "UPDATE job SET lease_owner = {0},"
+            " lease_expires = now() + {1} * interval '1 second'"
+            " WHERE job_id = ("
+            "   SELECT job_id FROM job"
+            "   WHERE job_type = {2}"
+            "   AND (lease_expires IS NULL OR lease_expires < now())"
+            + condition +
+            "   LIMIT 1"
+            "   FOR UPDATE SKIP LOCKED"
+            " )"
+            " RETURNING " + JOB_SELECT + ";",
+            *args,
+            columns=self.job_columns,
+            commit=True
+        )
+
+        return res[0] if res else None
+
+    def add_block_jobs(self, job_uuids, ranges):
+        """ Add unleased BLOCK jobs for [start, end) ranges """
+        return self.query(
+            "INSERT INTO job (job_uuid, job_type, block_range)"
+            " SELECT r.job_uuid, 'BLOCK', numrange(r.range_start, r.range_end)"
+            " FROM unnest({}::uuid[], {}::integer[], {}::integer[])"
+            " AS r(job_uuid, range_start, range_end);",
+            job_uuids,
+            [start for start, _ in ranges],
+            [end for _, end in ranges]
+        )
+
+    def add_leased_job(self, job_uuid, job_type, owner, lease_seconds,
+                       block_numbers=None, transactions=None):
+        """ Add a job already leased to owner """
+        return self.query(
+            "INSERT INTO job (job_uuid, job_type, lease_owner, lease_expires,"
+            " block_numbers, transactions)"
+            " VALUES ({}, {}, {}, now() + {} * interval '1 second',"
+            " {}::integer[], {}::varchar[]);",
+            job_uuid,
+            job_type,
+            owner,
+            lease_seconds,
+            block_numbers,
+            transactions
+        )
+
+    def get_block_ranges(self):
+        """ Get the [start, end) block ranges of every BLOCK job """
+        return [
+            (x[0], x[1])
+            for x in self.query(
+                "SELECT lower(block_range)::integer, upper(block_range)::integer"
+                " FROM job WHERE job_type = 'BLOCK';"
+            )
+        ]
+
+    def get_block_numbers(self, job_type):
+        """ Get the block numbers held by every job of a type """
+        return [
+            x[0]
+            for x in self.query(
+                "SELECT unnest(block_numbers) FROM job WHERE job_type = {};",
+                job_type
+            )
+        ]
+
+    def get_transactions(self):
+        """ Get the transaction hashes held by every TX_DETAIL job """
+        return [
+            x[0]
+            for x in self.query(
+                "SELECT unnest(transactions) FROM job WHERE job_type = 'TX_DETAIL';"
+            )
+        ]
+
+    def renew(self, owner, lease_seconds):
+        """ Extend the leases held by owner """
+        return self.query(
+            "UPDATE job SET lease_expires = now() + {} * interval '1 second'"
+            " WHERE lease_owner = {};",
+            lease_seconds,
+            owner,
+            commit=True
+        )
+
+    def hold(self, job_uuid, owner, lease_seconds):
+        """ Hand a job's lease over to a new owner and extend it """
+        return self.query(
+            "UPDATE job SET lease_owner = {},"
+            " lease_expires = now() + {} * interval '1 second'"
+            " WHERE job_uuid = {};",
+            owner,
+            lease_seconds,
+            job_uuid,
+            commit=True
+        )
+
+    def release(self, job_uuid):
+        """ Drop the lease on a job so it can be claimed again """
+        return self.query(
+            "UPDATE job SET lease_owner = NULL, lease_expires = NULL"
+            " WHERE job_uuid = {};",
+            job_uuid,
+            commit=True
+        )
+
+    def delete_job(self, job_uuid):
+        return self.query(
+            "DELETE FROM job WHERE job_uuid = {};",
+            job_uuid,
+            commit=True
+        )
+
+    def try_advisory_lock(self, key: int) -> bool:
+        """ Try to take a transaction-level advisory lock.  Only meaningful
+        inside start_transaction().
+        """
+        return self.query("SELECT pg_try_advisory_xact_lock({});", key)[0][0]
+
 
 class BlockModel(RawlBase):
     def __init__(self, dsn: str):
@@ -63,6 +394,88 @@ class BlockModel(RawlBase):
     def count(self):
         return self.query("SELECT COUNT(*) FROM block;")[0][0]
 
+    def estimate_count(self) -> int:
+        """ Estimate the number of blocks without scanning the table """
+        return estimate_rows(self, 'block')
+
+    def estimate_unprimed(self, limit: int) -> int:
+        """ Estimate the number of unprimed blocks, up to limit, from the size
+        of their partial index
+        """
+        return min(estimate_rows(self, 'block__unprimed'), limit)
+
+    def insert_blocks(self, chunks: Iterable[Tuple[Rows, Optional[Rows]]]) -> List[int]:
+        """ Insert blocks in one transaction.  chunks yields block rows paired
+        with the blocks' fully detailed transaction rows, or None.  Each chunk
+        is COPYed to a staging table as it comes, so chunks may still be
+        fetching the next ones from the node.  Blocks already in the DB are
+        left as they are.  Returns the numbers of the blocks that already
+        existed.
+
+        With transactions, they are stored in the same transaction and the
+        blocks are marked primed, so neither priming nor detail workers need
+        to visit them.
+        """
+        block_numbers: List[int] = []
+        columns: List[str] = []
+        tx_columns: List[str] = []
+        fused = False
+
+        self.start_transaction()
+
+        try:
+            staging = stage_table(self, 'block')
+            tx_staging = None
+
+            for blocks, transactions in chunks:
+                if not blocks:
+                    continue
+
+                columns = copy_rows(self, staging, blocks)
+                block_numbers.extend(blk['block_number'] for blk in blocks)
+
+                if transactions is not None:
+                    fused = True
+
+                if transactions:
+                    tx_staging = tx_staging or stage_table(self, 'transaction')
+                    tx_columns = copy_rows(self, tx_staging, transactions)
+
+            if not block_numbers:
+                self.rollback()
+                return []
+
+            inserted = insert_staged(
+                self,
+                'block',
+                columns,
+                "ON CONFLICT (block_number) DO NOTHING",
+                "RETURNING block_number"
+            )
+
+            if tx_columns:
+                insert_staged(self, 'transaction', tx_columns, TRANSACTION_UPSERT)
+
+            if fused:
+                self.query(
+                    "UPDATE block SET primed = true"
+                    " WHERE block_number = ANY({}::integer[]) AND primed = false;",
+                    block_numbers
+                )
+
+            self.commit()
+
+        except Exception:
+            self.rollback()
+            raise
+
+        inserted_numbers = set(x[0] for x in inserted)
+
+        return [
+            block_number for block_number in block_numbers
+            if block_number not in inserted_numbers
+        ]
+
     def get_range(self, start: datetime, end: datetime) -> tuple:
         """ Get a range of blocks from start to end """
 
@@ -124,6 +537,65 @@ class BlockModel(RawlBase):
         else:
             return []
 
+    def get_missing_ranges(self, start=0, end=1000000,
+                           chunk_size=1000000) -> Iterator[Tuple[int, int]]:
+        """ Get the [start, end) ranges of block numbers missing from the DB
+        between start and end.  The DB is walked in chunk_size windows and only
+        the gaps leave the database.  Gaps spanning a window boundary are
+        yielded as adjacent ranges.
+        """
+
+        for lo in range(start, end, chunk_size):
+            hi = min(lo + chunk_size, end)
+
+            res = self.query(
+                "SELECT block_number + 1, next_number FROM ("
+                "  SELECT block_number, lead(block_number, 1, {1})"
+                "    OVER (ORDER BY block_number) AS next_number"
+                "  FROM ("
+                "    SELECT {0} - 1 AS block_number"
+                "    UNION ALL"
+                "    SELECT block_number FROM block"
+                "    WHERE block_number >= {0} AND block_number < {1}"
+                "  ) AS numbers"
+                ") AS neighbours "
+                "WHERE next_number > block_number + 1 "
+                "ORDER BY block_number;",
+                lo,
+                hi
+            )
+
+            for gap in res:
+                yield (gap[0], gap[1])
+
+    def _get_island_ranges(self, start, end,
+                           chunk_size) -> Iterator[Tuple[int, int]]:
+        """ Get the [start, end) ranges of consecutive block numbers in the DB """
+
+        for lo in range(start, end, chunk_size):
+            hi = min(lo + chunk_size, end)
+
+            res = self.query(
+                "SELECT MIN(block_number), MAX(block_number) + 1 FROM ("
+                "  SELECT block_number, block_number - row_number()"
+                "    OVER (ORDER BY block_number) AS island"
+                "  FROM block"
+                "  WHERE block_number >= {} AND block_number < {}"
+                ") AS numbers "
+                "GROUP BY island "
+                "ORDER BY 1;",
+                lo,
+                hi
+            )
+
+            for island in res:
+                yield (island[0], island[1])
+
+    def get_present_ranges(self, start=0, end=1000000,
+                           chunk_size=1000000) -> Iterator[Tuple[int, int]]:
+        """ Get the [start, end) ranges of block numbers that are in the DB """
+        return self._get_island_ranges(start, end, chunk_size)
+
     def get_blocks(self, start=0, end=1000000) -> List[int]:
         """ Get blocks from the DB within the given range """
 
@@ -132,27 +604,38 @@ class BlockModel(RawlBase):
             "WHERE block_number >= {} and block_number < {};",
             self.columns, start, end)
 
-    def get_unprimed_blocks(self, limit=50, exclude=[]) -> List[int]:
-        """ Get blocks that are unprimed """
-        exclusion = ""
-
-        if len(exclude) > 0:
-            exclusion = "AND block_number NOT IN ({}) ".format(
-                ",".join(map(str, exclude))
-            )
-
+    def get_unprimed_blocks(self, limit=50,
+                            exclude: Iterable[int] = ()) -> List[int]:
+        """ Get the newest unprimed blocks, skipping the block numbers in
+        exclude.  Walks the partial index on unprimed blocks.
+        """
         return [
             x[0]
             for x in self.query(
                 "SELECT block_number FROM block "
                 "WHERE primed = false "
-                + exclusion +
+                "AND NOT block_number = ANY({}::integer[]) "
                 "ORDER BY block_number DESC "
                 "LIMIT {};",
+                list(exclude),
                 limit
             )
         ]
 
+    def validate_blocks(self, block_numbers: List[int]) -> Dict[int, List[str]]:
+        """ Validate many blocks at once.  Returns errors by block number for
+        blocks that are missing or look wrong.
+        """
+        return bulk_validate(self, 'integer', block_numbers, "No block",
+                             BLOCK_CHECKS)
+
+    def validate_blocks_primed(self, block_numbers: List[int]) -> Dict[int, List[str]]:
+        """ Validate that many blocks have been marked as primed.  Returns
+        errors by block number for blocks that have not.
+        """
+        return bulk_validate(self, 'integer', block_numbers, "No block",
+                             BLOCK_PRIMED_CHECKS)
+
     def validate_block_primed(self, block_number) -> Tuple[bool, List[str]]:
         """ Validate that a block has been marked as primed """
         blocks = self.select(
@@ -210,14 +693,138 @@ class TransactionModel(RawlBase):
     def count(self):
         return self.query("SELECT COUNT(*) FROM transaction;")[0][0]
 
-    def get_random_dirty(self, limit: int = 1) -> list:
-        """ Get a single dirty transaction """
+    def estimate_dirty(self, limit: int) -> int:
+        """ Estimate the number of dirty transactions, up to limit, from the
+        size of their partial index
+        """
+        return min(estimate_rows(self, 'transaction__dirty'), limit)
+
+    def get_dirty(self, limit: int = 1, after: Optional[str] = None,
+                  exclude: Iterable[str] = ()) -> List[str]:
+        """ Get the hashes of dirty transactions in hash order, starting after
+        the hash after and skipping the hashes in exclude.  Walks the partial
+        index on dirty transactions, so the cost doesn't grow with the number
+        of dirty transactions.
+        """
+        return [
+            x[0]
+            for x in self.query(
+                "SELECT hash FROM transaction"
+                " WHERE dirty = true"
+                " AND hash > {}"
+                " AND NOT hash = ANY({}::varchar[])"
+                " ORDER BY hash LIMIT {};",
+                after or '',
+                list(exclude),
+                limit
+            )
+        ]
 
-        return self.select(
-            "SELECT {} FROM transaction"
-            " WHERE dirty = true"
-            " ORDER BY random() LIMIT {};",
-            ['hash'], limit)
+    def get_next_dirty(self, limit: int, after: Optional[str] = None,
+                       exclude: Iterable[str] = ()) -> List[str]:
+        """ Like get_dirty(), but wraps around to the lowest hashes once the
+        end of the dirty transactions is reached.  Callers pass the last hash
+        they got as after to work through the dirty transactions in turn.
+
+        The cursor only says where to start looking.  Jobs handed out before
+        a wrap, or by another process with its own cursor, can hold hashes on
+        either side of it, so exclude must hold every hash still out in a job.
+        """
+        excluded = set(exclude)
+        hashes = self.get_dirty(limit, after, excluded)
+
+        if after is not None and len(hashes) < limit:
+            excluded.update(hashes)
+            hashes.extend(self.get_dirty(limit - len(hashes), None, excluded))
+
+        return hashes
+
+    def prime_transactions(self, chunks: Iterable[Tuple[List[int], Rows]]) -> List[str]:
+        """ Insert dirty transaction rows for blocks and mark the blocks
+        primed, all in one transaction.  chunks yields block numbers paired
+        with the rows of their transactions, and each chunk's rows are COPYed
+        to a staging table as they come.  Transactions already in the DB are
+        left as they are.  Returns the hashes that already existed.
+        """
+        block_numbers: List[int] = []
+        columns: List[str] = []
+        hashes: List[str] = []
+        inserted: list = []
+
+        self.start_transaction()
+
+        try:
+            staging = stage_table(self, 'transaction')
+
+            for chunk_numbers, transactions in chunks:
+                block_numbers.extend(chunk_numbers)
+
+                if transactions:
+                    columns = copy_rows(self, staging, transactions)
+                    hashes.extend(tx['hash'] for tx in transactions)
+
+            if columns:
+                inserted = insert_staged(
+                    self,
+                    'transaction',
+                    columns,
+                    "ON CONFLICT (hash) DO NOTHING",
+                    "RETURNING hash"
+                )
+
+            if block_numbers:
+                self.query(
+                    "UPDATE block SET primed = true"
+                    " WHERE block_number = ANY({}::integer[]) AND primed = false;",
+                    block_numbers
+                )
+
+            self.commit()
+
+        except Exception:
+            self.rollback()
+            raise
+
+        inserted_hashes = set(x[0] for x in inserted)
+
+        return [tx_hash for tx_hash in hashes if tx_hash not in inserted_hashes]
+
+    def update_transactions(self, chunks: Iterable[Rows]) -> int:
+        """ Fill in transactions' details with one join update from a staging
+        table, in one transaction.  Each chunk of rows is COPYed to the
+        staging table as it comes.  Returns the number updated.
+        """
+        columns: List[str] = []
+        updated: list = []
+
+        self.start_transaction()
+
+        try:
+            staging = stage_table(self, 'transaction')
+
+            for transactions in chunks:
+                if transactions:
+                    columns = copy_rows(self, staging, transactions)
+
+            if columns:
+                updated = self.query(
+                    "UPDATE transaction SET " +
+                    ", ".join(
+                        column + " = staged." + column
+                        for column in columns if column != 'hash'
+                    ) +
+                    " FROM " + staging + " AS staged"
+                    " WHERE transaction.hash = staged.hash"
+                    " RETURNING transaction.hash;"
+                )
+
+            self.commit()
+
+        except Exception:
+            self.rollback()
+            raise
+
+        return len(updated)
 
     def get_by_address(self, address: str) -> list:
         """ Get a list of transactions for an address """
@@ -241,6 +848,13 @@ class TransactionModel(RawlBase):
         else:
             return 0
 
+    def validate_transactions(self, tx_hashes: List[str]) -> Dict[str, List[str]]:
+        """ Validate many transactions at once.  Returns errors by hash for
+        transactions that are missing or look wrong.
+        """
+        return bulk_validate(self, 'varchar', tx_hashes, "No transaction",
+                             TRANSACTION_CHECKS)
+
     def validate_transaction(self, tx_hash) -> Tuple[bool, List[str]]:
         """ Validate that a transactions exists and that its values generally
         look correct.
@@ -366,6 +980,9 @@ def create_initial(DSN: str) -> bool:
     log.info("exists: %s" % exists)
 
     if exists[0] is True:
+        cur.close()
+        conn.close()
+        upgrade_schema(DSN)
         return False
 
     # Open initial.sql
@@ -394,3 +1011,66 @@ def create_initial(DSN: str) -> bool:
     conn.close()
 
     return True
+
+
+def upgrade_schema(DSN: str):
+    """ Bring an existing schema up to date with upgrade.sql.  Statements run
+    one at a time in autocommit, so indexes can be built concurrently.  Exits
+    if the upgrade fails, since nothing can run against an outdated schema.
+    """
+
+    upgrade_file = os.path.join(os.path.dirname(__file__), 'sql', 'upgrade.sql')
+
+    log.info("Upgrading schema with %s" % upgrade_file)
+
+    with open(upgrade_file) as sql_file:
+        # Drop comments and split into statements
+        statements = [
+            statement.strip()
+            for statement in re.sub(r'--[^\n]*', '', sql_file.read()).split(';')
+            if statement.strip()
+        ]
+
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    try:
+        # Wait out any other process upgrading at the same time.  Its
+        # concurrent index builds wait for every open transaction to finish,
+        # so the lock is polled in separate autocommit statements rather than
+        # waited on in one that stays open.
+        while True:
+            cur.execute("SELECT pg_try_advisory_lock(%s);", (UPGRADE_LOCK,))
+
+            if cur.fetchone()[0]:
+                break
+
+            log.info("Waiting for another process to upgrade the schema")
+            sleep(UPGRADE_POLL_INTERVAL)
+
+        # An interrupted concurrent build leaves an invalid index behind that
+        # IF NOT EXISTS would skip
+        for index_name in re.findall(r'IF NOT EXISTS (\w+) ON', ' '.join(statements)):
+            cur.execute(
+                "SELECT 1 FROM pg_index WHERE NOT indisvalid"
+                " AND indexrelid = to_regclass(%s);",
+                (index_name,)
+            )
+
+            if cur.fetchone():
+                log.warning("Rebuilding invalid index %s" % index_name)
+                cur.execute("DROP INDEX CONCURRENTLY IF EXISTS %s;" % index_name)
+
+        for statement in statements:
+            log.debug("Upgrade: %s" % statement)
+            cur.execute(statement)
+
+    except psycopg2.Error:
+        log.exception("Failed to upgrade schema")
+        cur.close()
+        conn.close()
+        sys.exit(52)
+
+    cur.close()
+    conn.close()
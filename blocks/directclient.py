@@ -0,0 +1,172 @@
+""" A stand-in for conductorclient that takes jobs straight from the job table,
+for running workers without a conductor.  Responses are shaped like the
+conductor's.
+"""
+import os
+from time import sleep, monotonic
+from web3 import Web3
+
+from typing import Optional
+
+from blocks.config import DSN, JSONRPC_NODE, LOGGER
+from blocks.db import BlockModel, TransactionModel
+from blocks.enums import WorkerType
+from blocks.jobqueue import JobQueue, check_job
+from blocks.conductor.conductor import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_HEAD_INTERVAL,
+    DEFAULT_JOB_LEASE,
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MIN_BATCH_SIZE,
+    DEFAULT_TARGET_JOB_SECONDS,
+    TX_BATCH_DIVISOR,
+)
+from blocks.conductor.headtracker import HeadTracker
+from blocks.conductor.lanes import (
+    TIP,
+    BACKFILL,
+    DEFAULT_TIP_BLOCKS,
+    DEFAULT_TIP_WEIGHT,
+    DEFAULT_BACKFILL_WEIGHT,
+    Lanes,
+)
+from blocks.conductor.sizing import BatchSizer
+from blocks.conductorclient import ConnectionError  # noqa: F401
+from blocks.session import PooledHTTPProvider
+
+BATCH_SIZE = int(os.environ.get('CONDUCTOR_BATCH_SIZE') or DEFAULT_BATCH_SIZE)
+JOB_LEASE = int(os.environ.get('CONDUCTOR_JOB_LEASE') or DEFAULT_JOB_LEASE)
+JOB_WAIT = float(os.environ.get('CONDUCTOR_JOB_WAIT', 30))
+HEAD_INTERVAL = float(
+    os.environ.get('CONDUCTOR_HEAD_INTERVAL') or DEFAULT_HEAD_INTERVAL
+)
+TARGET_JOB_SECONDS = float(
+    os.environ.get('CONDUCTOR_TARGET_JOB_SECONDS', DEFAULT_TARGET_JOB_SECONDS)
+)
+MIN_BATCH_SIZE = int(
+    os.environ.get('CONDUCTOR_MIN_BATCH_SIZE') or DEFAULT_MIN_BATCH_SIZE
+)
+MAX_BATCH_SIZE = int(
+    os.environ.get('CONDUCTOR_MAX_BATCH_SIZE') or DEFAULT_MAX_BATCH_SIZE
+)
+TIP_BLOCKS = int(os.environ.get('CONDUCTOR_TIP_BLOCKS') or DEFAULT_TIP_BLOCKS)
+TIP_WEIGHT = int(os.environ.get('CONDUCTOR_TIP_WEIGHT', DEFAULT_TIP_WEIGHT))
+BACKFILL_WEIGHT = int(
+    os.environ.get('CONDUCTOR_BACKFILL_WEIGHT', DEFAULT_BACKFILL_WEIGHT)
+)
+
+log = LOGGER.getChild(__name__)
+
+queue = JobQueue(
+    DSN,
+    JOB_LEASE,
+    Lanes({TIP: TIP_WEIGHT, BACKFILL: BACKFILL_WEIGHT}),
+    TIP_BLOCKS,
+)
+block_model = BlockModel(DSN)
+tx_model = TransactionModel(DSN)
+sizer = BatchSizer(TARGET_JOB_SECONDS, BATCH_SIZE, MIN_BATCH_SIZE, MAX_BATCH_SIZE)
+
+# Set up by init()
+web3: Optional[Web3] = None
+latest_on_chain = -1
+head_tracker: Optional[HeadTracker] = None
+
+
+def init():
+    """ Read the chain head and start following it.  Must be called before
+    any jobs are requested.  Later calls do nothing.
+    """
+    global web3, latest_on_chain, head_tracker
+
+    if head_tracker is not None:
+        return
+
+    web3 = Web3(PooledHTTPProvider(JSONRPC_NODE))
+    latest_on_chain = web3.eth.blockNumber
+    head_tracker = HeadTracker(web3, set_latest_on_chain, HEAD_INTERVAL, latest_on_chain)
+    head_tracker.start()
+
+
+def set_latest_on_chain(latest):
+    global latest_on_chain
+    latest_on_chain = latest
+
+
+def response_ok(data=None):
+    return {
+        'success': True,
+        'data': data,
+    }
+
+
+def response_error(message="General error"):
+    return {
+        'success': False,
+        'error': True,
+        'message': message,
+    }
+
+
+def ping(uuid):
+    queue.renew(uuid)
+    return response_ok()
+
+
+def job_request(uuid, worker_type, wait=JOB_WAIT):
+    deadline = monotonic() + wait
+
+    while True:
+        job = claim_job(uuid, worker_type)
+
+        if job is not None:
+            return response_ok(job.to_dict())
+
+        if monotonic() >= deadline:
+            break
+
+        sleep(1)
+
+    if wait > 0:
+        return response_ok(None)
+
+    return response_error('No work available')
+
+
+def claim_job(uuid, worker_type):
+    limit = sizer.size(
+        (uuid, worker_type),
+        TX_BATCH_DIVISOR if worker_type == WorkerType.TX_PRIME else 1,
+    )
+
+    job = queue.claim(worker_type, uuid, limit, latest_on_chain)
+
+    if job is not None:
+        sizer.start(job.job_uuid, (uuid, worker_type), job.item_count())
+
+    return job
+
+
+def job_submit(job_uuid, background=False):
+    job = queue.get(job_uuid)
+
+    if not job:
+        return response_error('Invalid job UUID')
+
+    sizer.finish(job_uuid)
+
+    verified, errors = check_job(job, block_model, tx_model)
+
+    if verified is not True:
+        return response_error(', '.join(errors))
+
+    queue.complete(job_uuid)
+
+    return response_ok()
+
+
+def job_reject(job_uuid, reason="Rejected"):
+    log.warning('Job {} rejected due to: {}'.format(job_uuid, reason))
+    sizer.cancel(job_uuid)
+    queue.release(job_uuid)
+    return response_ok()
@@ -0,0 +1,89 @@
+""" Compact encodings of job payloads
+
+Jobs are normally sent as JSON with every block number and transaction hash
+spelled out.  Consumers can instead ask for:
+
+ - compact JSON, with block numbers sent as [start, end) ranges under
+   block_ranges
+ - msgpack (Accept: application/msgpack), compact as above and with
+   transaction hashes sent as raw 32 byte strings.  Needs the msgpack package.
+
+decode_job() turns any of these back into the plain form.
+"""
+from typing import Any, Dict, Iterable, List
+
+from eth_utils import encode_hex, remove_0x_prefix
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+
+
+def to_ranges(numbers: Iterable[int]) -> List[List[int]]:
+    """ Run-length encode numbers as sorted [start, end) ranges """
+    ranges: List[List[int]] = []
+
+    for number in sorted(numbers):
+        if ranges and ranges[-1][1] == number:
+            ranges[-1][1] = number + 1
+        elif not ranges or ranges[-1][1] < number:
+            ranges.append([number, number + 1])
+
+    return ranges
+
+
+def from_ranges(ranges: Iterable[Iterable[int]]) -> List[int]:
+    """ Expand [start, end) ranges into the numbers they cover """
+    return [number for start, end in ranges for number in range(start, end)]
+
+
+def encode_job(job: Dict[str, Any], binary: bool = False) -> Dict[str, Any]:
+    """ Compact a job dict for the wire.  With binary, transaction hashes
+    become raw bytes for msgpack.
+    """
+    encoded = dict(job)
+
+    if 'block_numbers' in encoded:
+        encoded['block_ranges'] = to_ranges(encoded.pop('block_numbers'))
+
+    if binary and 'transactions' in encoded:
+        encoded['transactions'] = [
+            bytes.fromhex(remove_0x_prefix(tx_hash))
+            for tx_hash in encoded['transactions']
+        ]
+
+    return encoded
+
+
+def decode_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """ Turn a job dict from any encoding back into the plain form """
+    decoded = dict(job)
+
+    if 'block_ranges' in decoded:
+        decoded['block_numbers'] = from_ranges(decoded.pop('block_ranges'))
+
+    if 'transactions' in decoded:
+        decoded['transactions'] = [
+            encode_hex(tx_hash) if isinstance(tx_hash, bytes) else tx_hash
+            for tx_hash in decoded['transactions']
+        ]
+
+    return decoded
+
+
+def pack(obj: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError('msgpack is not installed')
+
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    if msgpack is None:
+        raise RuntimeError('msgpack is not installed')
+
+    return msgpack.unpackb(data, raw=False)
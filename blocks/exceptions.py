@@ -11,3 +11,15 @@ class LockExists(Exception):
 
 class ProcessShutdown(Exception):
     pass
+
+
+class BatchNotSupported(Exception):
+    pass
+
+
+class RPCError(Exception):
+    pass
+
+
+class TooManyWaiters(Exception):
+    pass
@@ -0,0 +1,355 @@
+""" Jobs kept in the job table so any number of processes can hand them out """
+from itertools import chain, islice
+from uuid import uuid4
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from blocks.config import LOGGER
+from blocks.db import JobModel, BlockModel, TransactionModel
+from blocks.enums import WorkerType
+from blocks.jobs import (
+    BlockJob,
+    TransactionPrimingJob,
+    TransactionDetailJob,
+    JobType,
+)
+from blocks.conductor.lanes import (
+    TIP,
+    BACKFILL,
+    DEFAULT_TIP_BLOCKS,
+    Lanes,
+)
+from blocks.conductor.ranges import RangeSet
+
+# Advisory lock keys serializing job creation for each worker type
+SEED_LOCKS = {
+    WorkerType.BLOCK: 320501,
+    WorkerType.TX_PRIME: 320502,
+    WorkerType.TX_DETAIL: 320503,
+}
+
+# The most BLOCK jobs created in one pass over the block table
+MAX_SEED_JOBS = 1000
+
+log = LOGGER.getChild(__name__)
+
+
+def job_from_row(row, consumer_uuid=None) -> JobType:
+    """ Build a job object from a JobModel.job_columns row """
+    worker_type = WorkerType.from_string(row['job_type'])
+    consumer_uuid = consumer_uuid or row['lease_owner']
+
+    if worker_type == WorkerType.BLOCK:
+        return BlockJob(
+            consumer_uuid=consumer_uuid,
+            block_numbers=list(range(row['range_start'], row['range_end'])),
+            job_uuid=row['job_uuid'],
+        )
+
+    elif worker_type == WorkerType.TX_PRIME:
+        return TransactionPrimingJob(
+            consumer_uuid=consumer_uuid,
+            block_numbers=row['block_numbers'] or [],
+            job_uuid=row['job_uuid'],
+        )
+
+    return TransactionDetailJob(
+        consumer_uuid=consumer_uuid,
+        transactions=row['transactions'] or [],
+        job_uuid=row['job_uuid'],
+    )
+
+
+def split_ranges(ranges: Iterable[Tuple[int, int]],
+                 size: int) -> Iterator[Tuple[int, int]]:
+    """ Split [start, end) ranges into ranges of at most size """
+    for start, end in ranges:
+        for chunk_start in range(start, end, size):
+            yield (chunk_start, min(chunk_start + size, end))
+
+
+def failure_messages(label: str, failures: Dict[Any, List[str]]) -> List[str]:
+    """ Flatten per-item validation errors into messages """
+    return [
+        '{} {}: {}'.format(label, key, error)
+        for key, errors in failures.items()
+        for error in errors
+    ]
+
+
+def check_job(job: JobType, block_model: BlockModel,
+              tx_model: TransactionModel) -> Tuple[bool, List[str]]:
+    """ Check the DB to see if a job's work has been done """
+    if isinstance(job, BlockJob):
+        log.debug('{}: Verifying block job...'.format(job.job_uuid))
+
+        failures = block_model.validate_blocks(job.block_numbers)
+
+        if failures:
+            log.warning('verify of blocks {} failed'.format(
+                ', '.join(map(str, failures))
+            ))
+            return (False, failure_messages('Block', failures))
+
+    elif isinstance(job, TransactionPrimingJob):
+        log.debug('{}: Verifying transcation priming job...'.format(job.job_uuid))
+
+        if not job.block_numbers:
+            log.error(
+                '{}: Job missing block numbers, probably an error'.format(
+                    job.job_uuid
+                )
+            )
+            return (False, ["Job missing block numbers"])
+
+        failures = block_model.validate_blocks_primed(job.block_numbers)
+
+        if failures:
+            return (False, failure_messages('Block', failures))
+
+    elif isinstance(job, TransactionDetailJob):
+        log.debug('{}: Verifying transcation job...'.format(job.job_uuid))
+
+        if not job.transactions:
+            log.error(
+                '{}: Job missing transactions, probably an error'.format(
+                    job.job_uuid
+                )
+            )
+            return (False, ["Job missing transactions"])
+
+        tx_failures = tx_model.validate_transactions(job.transactions)
+
+        if tx_failures:
+            return (False, failure_messages('Transaction', tx_failures))
+
+    else:
+        log.warning('{}: Unknown job type'.format(job.job_uuid))
+        return (False, ["Unknown job type"])
+
+    return (True, [])
+
+
+class JobQueue:
+    """ Hand out jobs stored in the job table.  Jobs are claimed with
+    FOR UPDATE SKIP LOCKED and leased to their consumer, so concurrent
+    claimers never get the same job.  New jobs are only created while holding
+    a per-type advisory lock.  BLOCK jobs are shared between lanes, the tip
+    lane taking jobs in the newest tip_blocks blocks.
+    """
+
+    def __init__(self, dsn: str, lease_seconds: int,
+                 lanes: Optional[Lanes] = None,
+                 tip_blocks: int = DEFAULT_TIP_BLOCKS):
+        self.dsn = dsn
+        self.lease_seconds = lease_seconds
+        self.lanes = lanes or Lanes({BACKFILL: 1})
+        self.tip_blocks = tip_blocks
+        # The chain head tip jobs were last seeded up to
+        self.seeded_head = -1
+        # Every missing block below this is covered by a job, so backfill
+        # seeding only needs to look above it
+        self.backfill_floor = 0
+        self.job_model = JobModel(dsn)
+        self.block_model = BlockModel(dsn)
+        self.tx_model = TransactionModel(dsn)
+        # The last dirty transaction hash this process handed out.  Hashes in
+        # other processes' jobs are excluded, so cursors may cross.
+        self.dirty_cursor = None
+
+    def claim(self, worker_type: WorkerType, consumer_uuid: str, limit: int,
+              latest_on_chain: int = -1) -> Optional[JobType]:
+        """ Get the consumer's current job, or lease it a new one """
+        job_type = str(worker_type)
+
+        row = self.job_model.get_leased(consumer_uuid, job_type)
+
+        if row is None and worker_type == WorkerType.BLOCK:
+            # New blocks go straight into tip jobs, without waiting for the
+            # backfill jobs ahead of them to run out
+            if latest_on_chain > self.seeded_head:
+                self._seed_block_jobs(limit, latest_on_chain, tip_only=True)
+
+            row = self._claim_block_job(consumer_uuid, latest_on_chain)
+
+            if row is None and self._seed_block_jobs(limit, latest_on_chain):
+                row = self._claim_block_job(consumer_uuid, latest_on_chain)
+
+        elif row is None:
+            row = self.job_model.claim(job_type, consumer_uuid, self.lease_seconds)
+
+        if row is not None:
+            return job_from_row(row, consumer_uuid)
+
+        if worker_type == WorkerType.BLOCK:
+            return None
+
+        return self._create_job(worker_type, consumer_uuid, limit)
+
+    def get_leased(self, worker_type: WorkerType,
+                   consumer_uuid: str) -> Optional[JobType]:
+        """ Get the consumer's current job, if it has one """
+        row = self.job_model.get_leased(consumer_uuid, str(worker_type))
+        return job_from_row(row, consumer_uuid) if row else None
+
+    def get(self, job_uuid) -> Optional[JobType]:
+        row = self.job_model.get_job(job_uuid)
+        return job_from_row(row) if row else None
+
+    def renew(self, consumer_uuid):
+        self.job_model.renew(consumer_uuid, self.lease_seconds)
+
+    def hold(self, job_uuid, owner):
+        """ Lease a job to owner instead of its consumer, e.g. while it is
+        being verified
+        """
+        self.job_model.hold(job_uuid, owner, self.lease_seconds)
+
+    def release(self, job_uuid):
+        self.job_model.release(job_uuid)
+
+    def complete(self, job_uuid):
+        self.job_model.delete_job(job_uuid)
+
+    def _claim_block_job(self, consumer_uuid: str, latest_on_chain: int):
+        """ Claim a BLOCK job from the first lane that has one """
+        for lane in self.lanes.order():
+            row = self.job_model.claim(
+                str(WorkerType.BLOCK),
+                consumer_uuid,
+                self.lease_seconds,
+                above=self.tip_floor(latest_on_chain) if lane == TIP else None,
+            )
+
+            if row is not None:
+                self.lanes.record(lane)
+                return row
+
+        return None
+
+    def tip_floor(self, latest_on_chain: int) -> int:
+        """ The lowest block number in the tip lane """
+        return max(latest_on_chain - self.tip_blocks, 0)
+
+    def _seed_block_jobs(self, limit: int, latest_on_chain: int,
+                         tip_only: bool = False) -> bool:
+        """ Add unleased BLOCK jobs for missing blocks not covered by a job,
+        tip blocks first.  Returns whether any were added.  The backfill is
+        only scanned above backfill_floor, so once it is covered only the tip
+        is seeded.
+        """
+        tip_floor = self.tip_floor(latest_on_chain)
+
+        if (
+            not tip_only
+            and self.seeded_head >= latest_on_chain
+            and self.backfill_floor >= tip_floor
+        ):
+            return False
+
+        model = JobModel(self.dsn)
+        model.start_transaction()
+
+        try:
+            if not model.try_advisory_lock(SEED_LOCKS[WorkerType.BLOCK]):
+                model.rollback()
+                return False
+
+            covered = RangeSet(model.get_block_ranges())
+            # Seed the tip first so it's never stuck behind a long backfill
+            gaps = self.block_model.get_missing_ranges(
+                start=tip_floor,
+                end=latest_on_chain,
+            )
+
+            if not tip_only:
+                gaps = chain(
+                    gaps,
+                    self.block_model.get_missing_ranges(
+                        start=min(self.backfill_floor, tip_floor),
+                        end=tip_floor,
+                    ),
+                )
+
+            uncovered = (
+                uncovered_range
+                for gap_start, gap_end in gaps
+                for uncovered_range in covered.complement(gap_start, gap_end).ranges()
+            )
+            ranges = list(islice(split_ranges(uncovered, limit), MAX_SEED_JOBS))
+
+            if ranges:
+                model.add_block_jobs([str(uuid4()) for _ in ranges], ranges)
+                log.info('Added {} block jobs'.format(len(ranges)))
+
+            model.commit()
+
+            # Everything scanned is covered unless the job cap cut it short
+            if len(ranges) < MAX_SEED_JOBS:
+                self.seeded_head = max(self.seeded_head, latest_on_chain)
+
+                if not tip_only:
+                    self.backfill_floor = max(self.backfill_floor, tip_floor)
+
+        except Exception:
+            model.rollback()
+            raise
+
+        return len(ranges) > 0
+
+    def _create_job(self, worker_type: WorkerType, consumer_uuid: str,
+                    limit: int) -> Optional[JobType]:
+        """ Create a new priming or detail job leased to the consumer """
+        model = JobModel(self.dsn)
+        model.start_transaction()
+
+        try:
+            if not model.try_advisory_lock(SEED_LOCKS[worker_type]):
+                model.rollback()
+                return None
+
+            job: JobType
+
+            if worker_type == WorkerType.TX_PRIME:
+                job = TransactionPrimingJob(
+                    consumer_uuid=consumer_uuid,
+                    block_numbers=self.block_model.get_unprimed_blocks(
+                        limit=limit,
+                        exclude=model.get_block_numbers(str(worker_type)),
+                    ),
+                )
+                items = job.block_numbers
+
+            else:
+                job = TransactionDetailJob(
+                    consumer_uuid=consumer_uuid,
+                    transactions=self.tx_model.get_next_dirty(
+                        limit=limit,
+                        after=self.dirty_cursor,
+                        exclude=model.get_transactions(),
+                    ),
+                )
+                items = job.transactions
+
+                if items:
+                    self.dirty_cursor = items[-1]
+
+            if not items:
+                model.rollback()
+                return None
+
+            model.add_leased_job(
+                job.job_uuid,
+                str(worker_type),
+                consumer_uuid,
+                self.lease_seconds,
+                block_numbers=getattr(job, 'block_numbers', None),
+                transactions=getattr(job, 'transactions', None),
+            )
+            model.commit()
+
+        except Exception:
+            model.rollback()
+            raise
+
+        return job
@@ -0,0 +1,82 @@
+""" Units of work handed out to workers """
+import json
+from abc import ABC, abstractmethod
+from time import monotonic
+from uuid import uuid4
+
+from typing import Union
+
+
+class JSONSerialized:
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+
+class Job(JSONSerialized, ABC):
+    def __init__(self, consumer_uuid, job_uuid=None):
+        self.job_uuid = str(job_uuid or uuid4())
+        self.consumer_uuid = consumer_uuid
+        self.lease_expires = 0.0
+
+    @abstractmethod
+    def item_count(self) -> int:
+        """ How many blocks or transactions the job covers """
+
+    def is_empty(self) -> bool:
+        return self.item_count() < 1
+
+    def renew(self, lease_seconds: int) -> float:
+        """ Extend the job's lease, returning the new expiry """
+        self.lease_expires = monotonic() + lease_seconds
+        return self.lease_expires
+
+
+class BlockJob(Job):
+    def __init__(self, consumer_uuid, block_numbers, job_uuid=None):
+        super(BlockJob, self).__init__(consumer_uuid, job_uuid)
+        self.block_numbers = block_numbers
+
+    def item_count(self) -> int:
+        return len(self.block_numbers)
+
+    def to_dict(self):
+        return {
+            'job_uuid': str(self.job_uuid),
+            'consumer_uuid': str(self.consumer_uuid),
+            'block_numbers': self.block_numbers,
+        }
+
+
+class TransactionPrimingJob(Job):
+    def __init__(self, consumer_uuid, block_numbers, job_uuid=None):
+        super(TransactionPrimingJob, self).__init__(consumer_uuid, job_uuid)
+        self.block_numbers = block_numbers
+
+    def item_count(self) -> int:
+        return len(self.block_numbers)
+
+    def to_dict(self):
+        return {
+            'job_uuid': str(self.job_uuid),
+            'consumer_uuid': str(self.consumer_uuid),
+            'block_numbers': self.block_numbers,
+        }
+
+
+class TransactionDetailJob(Job):
+    def __init__(self, consumer_uuid, transactions, job_uuid=None):
+        super(TransactionDetailJob, self).__init__(consumer_uuid, job_uuid)
+        self.transactions = transactions
+
+    def item_count(self) -> int:
+        return len(self.transactions)
+
+    def to_dict(self):
+        return {
+            'job_uuid': str(self.job_uuid),
+            'consumer_uuid': str(self.consumer_uuid),
+            'transactions': self.transactions,
+        }
+
+
+JobType = Union[BlockJob, TransactionPrimingJob, TransactionDetailJob]
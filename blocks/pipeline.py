@@ -0,0 +1,31 @@
+""" Overlap node requests with database writes """
+from collections import deque
+from concurrent.futures import Executor, Future
+
+from typing import Callable, Deque, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def ordered_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T],
+                in_flight: int) -> Iterator[R]:
+    """ Run fn over items on executor, keeping up to in_flight calls running
+    ahead of the consumer, and yield the results in the order of items.  Calls
+    not yet started are cancelled if the consumer stops early.
+    """
+    pending: Deque[Future] = deque()
+
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,167 @@
+""" Batched JSON-RPC requests to the Ethereum node
+
+web3 sends one HTTP request per call.  BatchClient sends many calls in one
+JSON-RPC batch instead, for nodes that accept batches.  Results come back raw,
+so format_block() and format_transaction() give them the same shape as
+web3.eth.getBlock() and web3.eth.getTransaction().
+"""
+from time import sleep
+
+from eth_utils import to_checksum_address, to_int
+from hexbytes import HexBytes
+from requests.exceptions import RequestException
+
+from typing import Any, Dict, List, Optional
+
+from blocks.config import HTTP_TIMEOUT, LOGGER
+from blocks.exceptions import BatchNotSupported, RPCError
+from blocks.session import get_session
+
+# Attempts at a batch the node or a proxy in front of it failed transiently
+# (429, 5xx or no connection), and the seconds before the first retry, doubled
+# for each one after
+BATCH_ATTEMPTS = 3
+RETRY_DELAY = 1
+
+BLOCK_INT_FIELDS = ('difficulty', 'gasLimit', 'gasUsed', 'number', 'size',
+                    'timestamp', 'totalDifficulty')
+BLOCK_BYTES_FIELDS = ('extraData', 'hash', 'logsBloom', 'mixHash', 'nonce',
+                      'parentHash', 'receiptsRoot', 'sha3Uncles', 'stateRoot',
+                      'transactionsRoot')
+TRANSACTION_INT_FIELDS = ('blockNumber', 'gas', 'gasPrice', 'nonce',
+                          'transactionIndex', 'value', 'v')
+TRANSACTION_BYTES_FIELDS = ('blockHash', 'hash', 'r', 's')
+TRANSACTION_ADDRESS_FIELDS = ('from', 'to')
+
+log = LOGGER.getChild(__name__)
+
+
+def _format(raw: Dict[str, Any], int_fields, bytes_fields,
+            address_fields=()) -> Dict[str, Any]:
+    formatted = dict(raw)
+
+    for field in int_fields:
+        if formatted.get(field) is not None:
+            formatted[field] = to_int(hexstr=formatted[field])
+
+    for field in bytes_fields:
+        if formatted.get(field) is not None:
+            formatted[field] = HexBytes(formatted[field])
+
+    for field in address_fields:
+        if formatted.get(field) is not None:
+            formatted[field] = to_checksum_address(formatted[field])
+
+    return formatted
+
+
+def format_transaction(raw: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """ Format a raw eth_getTransactionByHash result """
+    if raw is None:
+        return None
+
+    return _format(raw, TRANSACTION_INT_FIELDS, TRANSACTION_BYTES_FIELDS,
+                   TRANSACTION_ADDRESS_FIELDS)
+
+
+def format_block(raw: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """ Format a raw eth_getBlockByNumber result, with transaction hashes or
+    full transactions
+    """
+    if raw is None:
+        return None
+
+    block = _format(raw, BLOCK_INT_FIELDS, BLOCK_BYTES_FIELDS, ('miner',))
+    block['transactions'] = [
+        HexBytes(tx) if isinstance(tx, str) else format_transaction(tx)
+        for tx in block.get('transactions', [])
+    ]
+    block['uncles'] = [HexBytes(uncle) for uncle in block.get('uncles', [])]
+
+    return block
+
+
+class BatchClient:
+    """ Send JSON-RPC calls to endpoint in batches of up to batch_size.  Once
+    the node has answered a batch with something other than a list of
+    responses, batching is set to False and callers should fall back to single
+    calls.  Transient failures are retried and then raised as RPCError,
+    leaving batching as it was.
+    """
+
+    def __init__(self, endpoint: str, batch_size: int):
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.batching = batch_size > 1
+        self.session = get_session()
+
+    def call(self, method: str, params_list: List[List[Any]]) -> List[Any]:
+        """ Call method once for each params, returning results in order """
+        results: List[Any] = []
+
+        for start in range(0, len(params_list), self.batch_size):
+            results.extend(self._batch(
+                method,
+                params_list[start:start + self.batch_size],
+            ))
+
+        return results
+
+    def _batch(self, method: str, params_list: List[List[Any]]) -> List[Any]:
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+            for i, params in enumerate(params_list)
+        ]
+
+        res = self._post(payload)
+
+        # Nodes without batch support answer with a single error object
+        if not isinstance(res, list):
+            self.batching = False
+            raise BatchNotSupported('Node refused a batch of {} calls'.format(
+                len(payload)
+            ))
+
+        responses = {response.get('id'): response for response in res}
+        results = []
+
+        for i in range(len(payload)):
+            response = responses.get(i)
+
+            if response is None:
+                raise RPCError('No response to {} call {}'.format(method, i))
+
+            if response.get('error'):
+                raise RPCError('{} failed: {}'.format(method, response['error']))
+
+            results.append(response.get('result'))
+
+        return results
+
+    def _post(self, payload: List[Dict[str, Any]]) -> Any:
+        """ Post a batch, retrying transient failures, and decode the reply """
+        for attempt in range(BATCH_ATTEMPTS):
+            if attempt:
+                sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+            try:
+                r = self.session.post(self.endpoint, json=payload, timeout=HTTP_TIMEOUT)
+            except RequestException as err:
+                error = 'Batch request failed: {}'.format(err)
+                log.warning(error)
+                continue
+
+            if r.status_code == 429 or r.status_code >= 500:
+                error = 'Batch request failed ({})'.format(r.status_code)
+                log.warning(error)
+                continue
+
+            if r.status_code != 200:
+                raise RPCError('Batch request failed ({})'.format(r.status_code))
+
+            try:
+                return r.json()
+            except ValueError:
+                raise RPCError('Invalid JSON in response to a batch')
+
+        raise RPCError(error)
@@ -0,0 +1,54 @@
+""" Keep-alive HTTP connections shared by everything in a process
+
+Requests to the node and the conductor all go through one requests.Session,
+so connections are set up once and reused instead of for every call.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+from blocks.config import HTTP_GZIP, HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """ Get the process's shared session, creating it on first use """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_SIZE,
+                pool_maxsize=HTTP_POOL_SIZE,
+            )
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session.headers['Accept-Encoding'] = 'gzip, deflate' if HTTP_GZIP else 'identity'
+
+        return _session
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """ A web3 HTTPProvider that sends its requests over the shared session """
+
+    def __init__(self, endpoint_uri=None, request_kwargs=None):
+        request_kwargs = dict(request_kwargs or {})
+        request_kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        super(PooledHTTPProvider, self).__init__(endpoint_uri, request_kwargs)
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s",
+                          self.endpoint_uri, method)
+        r = get_session().post(
+            self.endpoint_uri,
+            data=self.encode_rpc_request(method, params),
+            **self.get_request_kwargs()
+        )
+        r.raise_for_status()
+
+        return self.decode_rpc_response(r.content)
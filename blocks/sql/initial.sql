@@ -13,9 +13,17 @@ CREATE TABLE job (
     job_id serial PRIMARY KEY,
     blocks boolean DEFAULT true NOT NULL,
     trasnactions boolean DEFAULT true NOT NULL,
-    block_range numrange DEFAULT null
+    block_range numrange DEFAULT null,
+    job_uuid uuid UNIQUE,
+    job_type varchar,
+    block_numbers integer[],
+    transactions varchar[],
+    lease_owner uuid,
+    lease_expires timestamp without time zone
 );
 CREATE INDEX job__job_id ON job (job_id);
+CREATE INDEX job__job_type__lease_expires ON job (job_type, lease_expires);
+CREATE INDEX job__lease_owner ON job (lease_owner);
 
 CREATE TABLE block (
     block_number serial PRIMARY KEY,
@@ -26,12 +34,14 @@ CREATE TABLE block (
     difficulty numeric NOT NULL,
     gas_used numeric NOT NULL,
     gas_limit integer NOT NULL,
-    size integer NOT NULL
+    size integer NOT NULL,
+    primed boolean DEFAULT false NOT NULL
 );
 CREATE INDEX block__block_timestamp ON block (block_timestamp);
 CREATE INDEX block__hash ON block (hash);
 CREATE INDEX block__miner ON block (miner);
 CREATE INDEX block__hash_lower ON block ((lower(hash)));
+CREATE INDEX block__unprimed ON block (block_number) WHERE primed = false;
 
 CREATE TABLE transaction (
     hash varchar(66) PRIMARY KEY,
@@ -50,6 +60,7 @@ CREATE INDEX transaction__from_address ON transaction (from_address);
 CREATE INDEX transaction__to_address ON transaction (to_address);
 CREATE INDEX transaction__from_address_lower ON transaction ((lower(from_address)));
 CREATE INDEX transaction__to_address_lower ON transaction ((lower(to_address)));
+CREATE INDEX transaction__dirty ON transaction (hash) WHERE dirty = true;
 
 CREATE TABLE lock (
     lock_id serial PRIMARY KEY,
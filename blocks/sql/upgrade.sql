@@ -0,0 +1,19 @@
+-- Brings a schema created by an older initial.sql up to date.  This runs on
+-- every startup, so every statement must be safe to repeat.  Statements run
+-- one at a time outside a transaction, so indexes are built CONCURRENTLY
+-- without blocking writes to big tables.
+
+ALTER TABLE job ADD COLUMN IF NOT EXISTS job_uuid uuid;
+-- Named like the index of initial.sql's UNIQUE constraint, so it is skipped
+-- where that exists
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS job_job_uuid_key ON job (job_uuid);
+ALTER TABLE job ADD COLUMN IF NOT EXISTS job_type varchar;
+ALTER TABLE job ADD COLUMN IF NOT EXISTS block_numbers integer[];
+ALTER TABLE job ADD COLUMN IF NOT EXISTS transactions varchar[];
+ALTER TABLE job ADD COLUMN IF NOT EXISTS lease_owner uuid;
+ALTER TABLE job ADD COLUMN IF NOT EXISTS lease_expires timestamp without time zone;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS job__job_type__lease_expires ON job (job_type, lease_expires);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS job__lease_owner ON job (lease_owner);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS transaction__dirty ON transaction (hash) WHERE dirty = true;
+ALTER TABLE block ADD COLUMN IF NOT EXISTS primed boolean DEFAULT false NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS block__unprimed ON block (block_number) WHERE primed = false;
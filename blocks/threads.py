@@ -4,9 +4,10 @@ import time
 import random
 import signal
 from enum import Enum
+from rawl import POOL_MAX_CONN
 
 from blocks.db import LockModel, LockExists, create_initial
-from blocks.config import DSN, LOGGER
+from blocks.config import DSN, HTTP_POOL_SIZE, JSONRPC_CONCURRENCY, LOGGER
 from blocks.blocks import StoreBlocks
 from blocks.transactions import StoreTransactions
 from blocks.txprimer import TransactionPriming
@@ -14,13 +15,51 @@ from blocks.enums import WorkerType
 
 log = LOGGER.getChild('blocks')
 
+# Pooled DB connections a worker thread taking jobs from the DB holds at once
+DIRECT_THREAD_CONNECTIONS = 2
 
-def start_thread(thread_type):
-    """ Run the consumer """
+
+def start_thread(thread_type, direct=False, workers=1, **options):
+    """ Run the consumer.  If direct, it takes jobs straight from the DB
+    rather than from the conductor.  workers is the number of worker threads
+    to run, all sharing the process's DB connection pool and HTTP session.
+    Any other options are passed on to the worker threads.
+    """
 
     if not isinstance(thread_type, WorkerType):
         raise ValueError("Invalid WorkerType")
 
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    # Each worker thread holds up to one pooled DB connection at a time.  A
+    # direct worker seeding jobs holds the job table transaction and queries
+    # the block or transaction table alongside it, so it needs two.  The lock
+    # model needs one more.
+    connections = workers * (DIRECT_THREAD_CONNECTIONS if direct else 1) + 1
+
+    if connections > POOL_MAX_CONN:
+        raise ValueError(
+            "{} {}workers need {} connections, more than the {} in the DB "
+            "pool".format(
+                workers,
+                'direct ' if direct else '',
+                connections,
+                POOL_MAX_CONN,
+            )
+        )
+
+    # Each worker keeps up to JSONRPC_CONCURRENCY requests in flight to the node
+    if workers * JSONRPC_CONCURRENCY > HTTP_POOL_SIZE:
+        raise ValueError(
+            "{} workers with JSONRPC_CONCURRENCY {} need HTTP_POOL_SIZE of at "
+            "least {}".format(
+                workers,
+                JSONRPC_CONCURRENCY,
+                workers * JSONRPC_CONCURRENCY,
+            )
+        )
+
     log.info("Checking database.")
 
     ThreadClass = None
@@ -34,23 +73,35 @@ def start_thread(thread_type):
         raise Exception("Unknown thread type")
 
     startup = True
-    main_thread = None
+    threads = [None] * workers
     lock_name = str(thread_type)
     lock = None
     pid = random.randint(0, 9999)
 
     create_initial(DSN)
 
+    if direct:
+        from blocks import directclient
+        directclient.init()
+
     # Model for lock management
     lockMod = LockModel(DSN)
 
+    def running():
+        return [t for t in threads if t is not None and t.is_alive()]
+
+    def stop_threads():
+        for t in running():
+            t.shutdown.set()
+
     def shutdown(signum, frame):
         log.debug('Caught signal %d. Shutting down...' % signum)
-        if main_thread:
-            main_thread.shutdown.set()
+        if any(threads):
+            stop_threads()
             # wait for shutdown
-            while main_thread.is_alive():
-                continue
+            for t in threads:
+                if t is not None:
+                    t.join()
             lockMod.unlock(lock_name, pid)
 
         log.info("Clean shut down. Goodbye.")
@@ -59,9 +110,6 @@ def start_thread(thread_type):
     signal.signal(signal.SIGTERM, shutdown)
     signal.signal(signal.SIGINT, shutdown)
 
-    main_thread = ThreadClass()
-    main_thread.daemon = True
-
     while lock or startup:
 
         try:
@@ -74,19 +122,28 @@ def start_thread(thread_type):
         except LockExists as e:
             log.warning(str(e))
 
-        # If we have a lock, but thread doesn't exist or died for some reason
-        if lock and (main_thread is None or not main_thread.is_alive()):
-            log.info("Starting thread...")
-            main_thread = ThreadClass()
-            main_thread.daemon = True
-            main_thread.start()
+        # If we have a lock, (re)start any threads that don't exist or died
+        if lock:
+            for i, t in enumerate(threads):
+                if t is not None and t.is_alive():
+                    continue
+
+                # Don't leave a dead thread's fetch pool behind
+                if t is not None:
+                    t.fetcher.shutdown(wait=False)
+
+                log.info("Starting thread {} of {}...".format(i + 1, workers))
+                threads[i] = ThreadClass(direct=direct, **options)
+                threads[i].daemon = True
+                threads[i].start()
+                log.info("Thread started.")
+
             startup = False
-            log.info("Thread started.")
 
-        # If main thread exists but we don't have a lock, shutdown
-        elif main_thread is not None and main_thread.is_alive() and not lock:
-            log.info("Lost lock, stopping thread.")
-            main_thread.shutdown.set()
+        # If threads are running but we don't have a lock, shutdown
+        elif running():
+            log.info("Lost lock, stopping threads.")
+            stop_threads()
             lockMod.unlock(lock_name, pid)
             startup = True
 
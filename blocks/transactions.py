@@ -1,23 +1,51 @@
 """ consumer.py is what stuffs the DB """
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from time import sleep
 from datetime import datetime, timedelta
-from web3 import Web3, HTTPProvider
-
-from blocks.config import DSN, JSONRPC_NODE, LOGGER
+from eth_utils.hexadecimal import encode_hex
+from web3 import Web3
+
+from blocks.config import (
+    DSN,
+    JSONRPC_NODE,
+    JSONRPC_BATCH_SIZE,
+    JSONRPC_CONCURRENCY,
+    LOGGER,
+)
 from blocks.db import TransactionModel
 from blocks.enums import WorkerType
-from blocks.conductorclient import ConnectionError, ping, job_request, job_submit
+from blocks.exceptions import BatchNotSupported
+from blocks.pipeline import ordered_map
+from blocks.rpc import BatchClient, format_transaction
+from blocks.session import PooledHTTPProvider
+from blocks.conductorclient import ConnectionError
 
 log = LOGGER.getChild(__name__)
 
 
+def transaction_row(tx):
+    """ Get the fully populated DB row for a transaction from the node """
+    return {
+        'hash': encode_hex(tx['hash']),
+        'dirty': False,
+        'block_number': tx['blockNumber'],
+        'from_address': tx['from'],
+        'to_address': tx['to'],
+        'value': tx['value'],
+        'gas_price': tx['gasPrice'],
+        'gas_limit': tx['gas'],
+        'nonce': tx['nonce'],
+        'input': tx['input'],
+    }
+
+
 class StoreTransactions(threading.Thread):
     """ Populate tx data for "dirty" transactions in the DB """
 
-    def __init__(self):
+    def __init__(self, direct=False):
         super(StoreTransactions, self).__init__()
         self.uuid = str(uuid4())
         self.model = TransactionModel(DSN)
@@ -27,7 +55,23 @@ class StoreTransactions(threading.Thread):
             from web3.auto.infura import w3 as web3
             self.web3 = web3
         else:
-            self.web3 = Web3(HTTPProvider(JSONRPC_NODE))
+            self.web3 = Web3(PooledHTTPProvider(JSONRPC_NODE))
+
+        self.rpc = BatchClient(
+            getattr(self.web3.providers[0], 'endpoint_uri', JSONRPC_NODE),
+            JSONRPC_BATCH_SIZE,
+        )
+
+        # Take jobs straight from the DB instead of through the conductor
+        if direct:
+            from blocks import directclient as client
+        else:
+            from blocks import conductorclient as client
+
+        self.client = client
+
+        # Fetches transactions ahead while this thread writes them
+        self.fetcher = ThreadPoolExecutor(max_workers=JSONRPC_CONCURRENCY)
 
         self.shutdown = threading.Event()
 
@@ -41,15 +85,77 @@ class StoreTransactions(threading.Thread):
 
         return self.web3.eth.getTransaction(tx_hash)
 
+    def fetch_transactions(self, tx_hashes):
+        """ Gets transactions in a JSON-RPC batch, or one at a time if the node
+        won't take batches
+        """
+        if self.rpc.batching:
+            log.debug("Fetching {} transactions".format(len(tx_hashes)))
+
+            try:
+                return [
+                    format_transaction(tx)
+                    for tx in self.rpc.call(
+                        'eth_getTransactionByHash',
+                        [[tx_hash] for tx_hash in tx_hashes],
+                    )
+                ]
+            except BatchNotSupported:
+                log.warning('Node does not support batches, fetching transactions singly')
+
+        return [self.get_transaction(tx_hash) for tx_hash in tx_hashes]
+
+    def get_transactions(self, tx_hashes):
+        """ Gets transactions, with up to JSONRPC_CONCURRENCY batches or single
+        fetches in flight.  Yields chunks of (hash, transaction) in order.
+        """
+        size = self.rpc.batch_size if self.rpc.batching else 1
+        chunks = [
+            tx_hashes[start:start + size]
+            for start in range(0, len(tx_hashes), size)
+        ]
+
+        for chunk, transactions in zip(chunks, ordered_map(
+            self.fetcher,
+            self.fetch_transactions,
+            chunks,
+            JSONRPC_CONCURRENCY,
+        )):
+            yield list(zip(chunk, transactions))
+
+    def get_rows(self, tx_hashes):
+        """ Gets the DB rows for transactions a fetched chunk at a time,
+        stopping early if told to shut down.  Transactions the node doesn't
+        have are skipped.
+        """
+        for chunk in self.get_transactions(tx_hashes):
+
+            # If we've been told to shutdown...
+            if self.shutdown.is_set():
+                log.info("Shutting down gracefully...")
+                return
+
+            rows = []
+
+            for tx_hash, tx in chunk:
+                if tx is None:
+                    log.warning("Transaction {} not found".format(tx_hash))
+                    continue
+
+                log.debug("Processing transaction {}".format(tx_hash))
+                rows.append(transaction_row(tx))
+
+            yield rows
+
     def get_dirty_transaction(self):
         """ Gets a tx that needs to be populated """
 
-        res = self.model.get_random_dirty()
+        res = self.model.get_dirty()
 
         if not res:
             return None
 
-        return self.web3.eth.getTransaction(res[0]['hash'])
+        return self.web3.eth.getTransaction(res[0])
 
     def process_transactions(self):
         """ Process the transactions from the chain """
@@ -68,7 +174,7 @@ class StoreTransactions(threading.Thread):
                 or self.last_ping < datetime.now() - timedelta(seconds=15)
             ):
                 try:
-                    ping(self.uuid)
+                    self.client.ping(self.uuid)
 
                 except ConnectionError:
                     log.warning('Unable to connect to the conductor.')
@@ -78,7 +184,7 @@ class StoreTransactions(threading.Thread):
             job_response = None
 
             try:
-                job_response = job_request(self.uuid, WorkerType.TX_DETAIL)
+                job_response = self.client.job_request(self.uuid, WorkerType.TX_DETAIL)
             except ConnectionError:
                 log.error('Failed to connect to the conductor.')
                 sleep(3)
@@ -92,37 +198,18 @@ class StoreTransactions(threading.Thread):
 
             job = job_response['data']
 
-            for tx_hash in job['transactions']:
-
-                tx = self.web3.eth.getTransaction(tx_hash)
-
-                log.debug("Processing transaction {}".format(tx['hash'].hex()))
-
-                self.model.query(
-                    "UPDATE transaction SET "
-                    " dirty = false,"
-                    " block_number = {0},"
-                    " from_address = {1},"
-                    " to_address = {2},"
-                    " value = {3},"
-                    " gas_price = {4},"
-                    " gas_limit = {5},"
-                    " nonce = {6},"
-                    " input = {7}"
-                    " WHERE hash = {8};",
-                    tx['blockNumber'],
-                    tx['from'],
-                    tx['to'],
-                    tx['value'],
-                    tx['gasPrice'],
-                    tx['gas'],
-                    tx['nonce'],
-                    tx['input'],
-                    tx['hash'].hex(),
-                    commit=True
-                )
-
-            job_submit(job['job_uuid'])
+            # A long-poll that ran out of time without work; just ask again
+            if job is None:
+                continue
+
+            log.info('Updating {} transactions'.format(len(job['transactions'])))
+
+            self.model.update_transactions(self.get_rows(job['transactions']))
+
+            if self.shutdown.is_set():
+                self.client.job_reject(job['job_uuid'], 'Worker shutting down')
+            else:
+                self.client.job_submit(job['job_uuid'])
 
     def run(self):
         """ Kick off the process """
@@ -1,18 +1,19 @@
 """ consumer.py is what stuffs the DB """
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 from uuid import uuid4
-from time import sleep
 from datetime import datetime, timedelta
-from psycopg2.errors import UniqueViolation
 from eth_utils import add_0x_prefix
-from web3 import Web3, HTTPProvider
+from web3 import Web3
 
-from blocks.config import DSN, JSONRPC_NODE, LOGGER
+from blocks.config import DSN, JSONRPC_NODE, JSONRPC_CONCURRENCY, LOGGER
 from blocks.db import BlockModel, TransactionModel
 from blocks.enums import WorkerType
-from blocks.conductorclient import ConnectionError, ping, job_request, job_submit
+from blocks.pipeline import ordered_map
+from blocks.session import PooledHTTPProvider
+from blocks.conductorclient import ConnectionError
 
 log = LOGGER.getChild(__name__)
 
@@ -22,7 +23,7 @@ class TransactionPriming(threading.Thread):
     the link between block and transaction.  tx details are primed by another
     process. """
 
-    def __init__(self):
+    def __init__(self, direct=False):
         super(TransactionPriming, self).__init__()
         self.uuid = str(uuid4())
         self.block_model = BlockModel(DSN)
@@ -33,7 +34,18 @@ class TransactionPriming(threading.Thread):
             from web3.auto.infura import w3 as web3
             self.web3 = web3
         else:
-            self.web3 = Web3(HTTPProvider(JSONRPC_NODE))
+            self.web3 = Web3(PooledHTTPProvider(JSONRPC_NODE))
+
+        # Take jobs straight from the DB instead of through the conductor
+        if direct:
+            from blocks import directclient as client
+        else:
+            from blocks import conductorclient as client
+
+        self.client = client
+
+        # Fetches blocks ahead while this thread writes them
+        self.fetcher = ThreadPoolExecutor(max_workers=JSONRPC_CONCURRENCY)
 
         self.shutdown = threading.Event()
 
@@ -47,6 +59,33 @@ class TransactionPriming(threading.Thread):
 
         return self.web3.eth.getBlock(blk_no)
 
+    def get_rows(self, block_numbers):
+        """ Gets the dirty transaction rows for blocks, with up to
+        JSONRPC_CONCURRENCY blocks fetched ahead, stopping early if told to
+        shut down.  Yields ([block number], transaction rows) for each block.
+        """
+        blocks = ordered_map(
+            self.fetcher,
+            self.get_block,
+            block_numbers,
+            JSONRPC_CONCURRENCY,
+        )
+
+        for block_no, block in zip(block_numbers, blocks):
+
+            # If we've been told to shutdown...
+            if self.shutdown.is_set():
+                log.info("Shutting down gracefully...")
+                return
+
+            log.debug("Processing block {}".format(block_no))
+
+            yield [block_no], [{
+                'hash': add_0x_prefix(tx_hash.hex()),
+                'dirty': True,
+                'block_number': block_no,
+            } for tx_hash in block['transactions']]
+
     def process_blocks(self):
         """ Prime transactions into the DB for blocks given in a job """
 
@@ -64,7 +103,7 @@ class TransactionPriming(threading.Thread):
                 or self.last_ping < datetime.now() - timedelta(seconds=15)
             ):
                 try:
-                    ping(self.uuid)
+                    self.client.ping(self.uuid)
 
                 except ConnectionError:
                     log.warning('Unable to connect to the conductor.')
@@ -74,7 +113,7 @@ class TransactionPriming(threading.Thread):
             job_response = None
 
             try:
-                job_response = job_request(self.uuid, WorkerType.TX_PRIME)
+                job_response = self.client.job_request(self.uuid, WorkerType.TX_PRIME)
             except ConnectionError:
                 log.error('Failed to connect to the conductor.')
                 sleep(3)
@@ -88,35 +127,21 @@ class TransactionPriming(threading.Thread):
 
             job = job_response['data']
 
-            for block_no in job['block_numbers']:
-
-                block = self.get_block(block_no)
-
-                log.debug("Processing block {}".format(block_no))
-
-                for tx_hash in block['transactions']:
-                    normal_hash = add_0x_prefix(tx_hash.hex())
-                    try:
-                        self.tx_model.query(
-                            "INSERT INTO transaction (hash, dirty, block_number) "
-                            "VALUES ({}, {}, {});",
-                            normal_hash,
-                            True,
-                            block_no,
-                            commit=True
-                        )
-                    except UniqueViolation:
-                        # TODO: Should we do something more intelligent?
-                        log.warning("Transaction {} exists.".format(normal_hash))
-                        pass
-
-                self.block_model.query(
-                    "UPDATE BLOCK set primed = true WHERE block_number = {}",
-                    block_no,
-                    commit=True
-                )
-
-            job_submit(job['job_uuid'])
+            # A long-poll that ran out of time without work; just ask again
+            if job is None:
+                continue
+
+            block_numbers = job['block_numbers']
+
+            log.info('Priming transactions for {} blocks'.format(len(block_numbers)))
+
+            for tx_hash in self.tx_model.prime_transactions(self.get_rows(block_numbers)):
+                log.warning("Transaction {} exists.".format(tx_hash))
+
+            if self.shutdown.is_set():
+                self.client.job_reject(job['job_uuid'], 'Worker shutting down')
+            else:
+                self.client.job_submit(job['job_uuid'])
 
     def run(self):
         """ Kick off the process """
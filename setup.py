@@ -28,7 +28,7 @@ setup(
     ],
     keywords='ethereum',
     packages=find_packages(exclude=['build', 'dist']),
-    package_data={'': ['README.md', 'sql/initial.sql']},
+    package_data={'': ['README.md', 'sql/initial.sql', 'sql/upgrade.sql']},
     install_requires=[
         'rawl>=0.3.5',
         'Flask>=0.12.2',
@@ -43,7 +43,12 @@ setup(
     extras_require={
         'dev': [
             'flake8>=3.8.4',
-            'mypy>=0.790'
+            'mypy>=0.790',
+            'pytest>=6.0'
+        ],
+        # Binary job payloads (CONDUCTOR_JOB_ENCODING=msgpack)
+        'msgpack': [
+            'msgpack>=1.0.0'
         ]
     },
     # Every damned Ethereum python package in PyPi seems afflicted with a pypandoc
@@ -0,0 +1,5 @@
+import os
+
+# blocks.config refuses to load without a database user, though nothing here
+# connects to the database
+os.environ.setdefault('PGUSER', 'blocks')
@@ -0,0 +1,86 @@
+from blocks.enums import WorkerType
+from blocks.conductor.backpressure import MAX_BACKLOG_COUNT, Backpressure, Stage
+
+
+class Backlog:
+    """ A stage measure returning a backlog set by the test """
+
+    def __init__(self, size=0):
+        self.size = size
+        self.limits = []
+
+    def __call__(self, limit):
+        self.limits.append(limit)
+        return min(self.size, limit)
+
+
+def test_stage_throttles_between_watermarks():
+    backlog = Backlog()
+    stage = Stage(backlog, (100, 50))
+
+    assert stage.update() is False
+    assert stage.throttling is False
+
+    backlog.size = 99
+    assert stage.update() is False
+
+    backlog.size = 100
+    assert stage.update() is True
+    assert stage.throttling is True
+
+    # Still throttling until the backlog drains to the low watermark
+    backlog.size = 51
+    assert stage.update() is False
+    assert stage.throttling is True
+
+    backlog.size = 50
+    assert stage.update() is True
+    assert stage.throttling is False
+
+    assert backlog.limits == [200] * 5
+
+
+def test_stage_without_high_watermark_never_throttles():
+    backlog = Backlog(MAX_BACKLOG_COUNT * 2)
+    stage = Stage(backlog)
+
+    assert stage.update() is False
+    assert stage.throttling is False
+    assert stage.backlog == MAX_BACKLOG_COUNT
+
+
+def test_backpressure_holds_back_upstream_and_reports_release():
+    unprimed = Backlog()
+    dirty = Backlog()
+    released = []
+    backpressure = Backpressure(
+        {
+            WorkerType.BLOCK: Stage(Backlog()),
+            WorkerType.TX_PRIME: Stage(unprimed, (100, 50)),
+            WorkerType.TX_DETAIL: Stage(dirty, (1000, 500)),
+        },
+        30,
+        lambda: released.append(True),
+    )
+
+    dirty.size = 1000
+    backpressure.update()
+
+    assert backpressure.throttled(WorkerType.TX_PRIME)
+    assert not backpressure.throttled(WorkerType.BLOCK)
+    assert not backpressure.throttled(WorkerType.TX_DETAIL)
+    assert released == []
+
+    unprimed.size = 100
+    backpressure.update()
+
+    assert backpressure.throttled(WorkerType.BLOCK)
+    assert released == []
+
+    dirty.size = 0
+    backpressure.update()
+
+    assert not backpressure.throttled(WorkerType.TX_PRIME)
+    assert backpressure.throttled(WorkerType.BLOCK)
+    assert released == [True]
+    assert backpressure.report()[str(WorkerType.TX_DETAIL)]['backlog'] == 0
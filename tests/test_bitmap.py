@@ -0,0 +1,69 @@
+import random
+
+from blocks.conductor.bitmap import Bitmap
+
+
+def test_single_bits_match_set():
+    rng = random.Random(1)
+    bitmap = Bitmap()
+    expected = set()
+
+    for _ in range(5000):
+        n = rng.randrange(0, 300)
+
+        if rng.random() < 0.6:
+            bitmap.add(n)
+            expected.add(n)
+        else:
+            bitmap.discard(n)
+            expected.discard(n)
+
+    assert len(bitmap) == len(expected)
+    assert set(bitmap) == expected
+    assert all((n in bitmap) == (n in expected) for n in range(400))
+
+
+def test_range_updates_match_set():
+    """ Ranges start and end on and off byte boundaries, to cover the whole
+    byte fast path and the partial bytes at either end
+    """
+    rng = random.Random(2)
+    bitmap = Bitmap()
+    expected = set()
+
+    for _ in range(2000):
+        start = rng.randrange(0, 200)
+        end = start + rng.choice([0, 1, 7, 8, 9, 16, 17, rng.randrange(0, 64)])
+
+        if rng.random() < 0.6:
+            bitmap.add_range(start, end)
+            expected.update(range(start, end))
+        else:
+            bitmap.discard_range(start, end)
+            expected.difference_update(range(start, end))
+
+        assert len(bitmap) == len(expected)
+
+    assert set(bitmap) == expected
+
+
+def test_ranges_are_maximal_runs():
+    bitmap = Bitmap()
+    bitmap.add_range(3, 8)
+    bitmap.add_range(8, 17)
+    bitmap.add_range(40, 41)
+    bitmap.add(64)
+
+    assert list(bitmap.ranges()) == [(3, 17), (40, 41), (64, 65)]
+    assert list(bitmap.ranges(10)) == [(10, 17), (40, 41), (64, 65)]
+    assert list(bitmap.ranges(18)) == [(40, 41), (64, 65)]
+
+
+def test_round_trips_through_bytes():
+    bitmap = Bitmap()
+    bitmap.update([0, 9, 1000])
+
+    copy = Bitmap(bytes(bitmap.bits))
+
+    assert set(copy) == {0, 9, 1000}
+    assert len(copy) == 3
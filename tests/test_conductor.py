@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import pytest
+
+try:
+    import web3  # noqa: F401
+except ImportError:
+    # web3 4 doesn't import on Python 3.10 and up
+    pytest.skip('web3 is not importable', allow_module_level=True)
+
+from blocks import jobs  # noqa: E402
+from blocks.enums import WorkerType  # noqa: E402
+from blocks.conductor import conductor as conductor_module  # noqa: E402
+
+JOB_LEASE = 60
+
+
+class EmptyModel:
+    """ Stands in for the conductor's models over an empty database """
+
+    def __init__(self, dsn):
+        pass
+
+    def get_latest(self):
+        return 0
+
+    def estimate_unprimed(self, limit):
+        return 0
+
+    def estimate_dirty(self, limit):
+        return 0
+
+    def ping(self, uuid):
+        pass
+
+
+class Node:
+    def __init__(self, provider):
+        self.eth = SimpleNamespace(blockNumber=100)
+
+
+class Idle:
+    """ Stands in for the conductor's background threads """
+
+    def __init__(self, *args):
+        pass
+
+    def start(self):
+        pass
+
+    def throttled(self, worker_type):
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conductor_module, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(jobs, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def conductor(monkeypatch, clock):
+    for model in ('ConsumerModel', 'BlockModel', 'TransactionModel'):
+        monkeypatch.setattr(conductor_module, model, EmptyModel)
+
+    monkeypatch.setattr(conductor_module, 'Web3', Node)
+    monkeypatch.setattr(conductor_module, 'HeadTracker', Idle)
+    monkeypatch.setattr(conductor_module, 'Backpressure', Idle)
+
+    # Only the backfill lane, so jobs take the lowest missing blocks
+    conductor = conductor_module.Conductor(
+        batch_size=10,
+        min_batch_size=1,
+        max_batch_size=10,
+        job_lease=JOB_LEASE,
+        tip_weight=0,
+    )
+    conductor.update_latest_on_chain(100)
+
+    return conductor
+
+
+def test_job_is_leased_to_its_consumer(conductor):
+    job = conductor.generate_job(WorkerType.BLOCK, 'a')
+
+    assert job.block_numbers == list(range(10))
+    assert conductor.get_job('a') is job
+    assert conductor.get_job(job.job_uuid) is job
+
+    # Asking again gets the same job, and nobody else gets its blocks
+    assert conductor.generate_job(WorkerType.BLOCK, 'a') is job
+    assert conductor.generate_job(WorkerType.BLOCK, 'b').block_numbers == list(range(10, 20))
+
+
+def test_expired_lease_is_reclaimed(conductor, clock):
+    job = conductor.generate_job(WorkerType.BLOCK, 'a')
+
+    clock[0] += JOB_LEASE + 1
+    other = conductor.generate_job(WorkerType.BLOCK, 'b')
+
+    assert conductor.get_job('a') is None
+    assert conductor.get_job(job.job_uuid) is None
+    assert other.block_numbers == job.block_numbers
+
+
+def test_ping_renews_lease(conductor, clock):
+    job = conductor.generate_job(WorkerType.BLOCK, 'a')
+
+    clock[0] += JOB_LEASE - 1
+    conductor.ping('a')
+    clock[0] += JOB_LEASE - 1
+    other = conductor.generate_job(WorkerType.BLOCK, 'b')
+
+    assert conductor.get_job('a') is job
+    assert other.block_numbers == list(range(10, 20))
+
+    # Stale heap entries from before the renewal are skipped
+    clock[0] += 2
+    assert conductor.generate_job(WorkerType.BLOCK, 'c').block_numbers == job.block_numbers
+
+
+def test_rejected_job_is_released(conductor):
+    job = conductor.generate_job(WorkerType.BLOCK, 'a')
+    conductor.reject_job(job.job_uuid)
+
+    assert conductor.get_job('a') is None
+    assert conductor.get_job(job.job_uuid) is None
+    assert len(conductor.selected_block_numbers) == 0
+    assert conductor.generate_job(WorkerType.BLOCK, 'b').block_numbers == job.block_numbers
@@ -0,0 +1,62 @@
+from blocks.db import TransactionModel
+
+HASHES = ['0x{:064x}'.format(n) for n in range(10)]
+
+
+class DirtyTransactions(TransactionModel):
+    """ A TransactionModel over an in-memory list of dirty hashes """
+
+    def __init__(self, hashes):
+        self.hashes = sorted(hashes)
+
+    def get_dirty(self, limit=1, after=None, exclude=()):
+        exclude = set(exclude)
+
+        return [
+            tx_hash for tx_hash in self.hashes
+            if tx_hash > (after or '') and tx_hash not in exclude
+        ][:limit]
+
+
+def test_next_dirty_wraps_around():
+    model = DirtyTransactions(HASHES)
+
+    assert model.get_next_dirty(4) == HASHES[:4]
+    assert model.get_next_dirty(4, after=HASHES[3]) == HASHES[4:8]
+    assert model.get_next_dirty(4, after=HASHES[7]) == HASHES[8:] + HASHES[:2]
+    assert model.get_next_dirty(4, after=HASHES[9]) == HASHES[:4]
+
+
+def test_next_dirty_skips_outstanding_hashes_after_a_wrap():
+    model = DirtyTransactions(HASHES)
+    outstanding = set()
+
+    first = model.get_next_dirty(4, exclude=outstanding)
+    outstanding.update(first)
+    second = model.get_next_dirty(4, after=first[-1], exclude=outstanding)
+    outstanding.update(second)
+
+    # The first job is released, so its hashes go back up for grabs
+    outstanding.difference_update(first)
+
+    third = model.get_next_dirty(4, after=second[-1], exclude=outstanding)
+    assert third == HASHES[8:] + HASHES[:2]
+    outstanding.update(third)
+
+    # The cursor is now behind the second job's hashes
+    fourth = model.get_next_dirty(4, after=third[-1], exclude=outstanding)
+    assert fourth == HASHES[2:4]
+
+
+def test_next_dirty_cursors_may_cross():
+    model = DirtyTransactions(HASHES)
+    outstanding = set()
+
+    ours = model.get_next_dirty(4, after=HASHES[5], exclude=outstanding)
+    outstanding.update(ours)
+
+    # Another process's cursor, behind ours
+    theirs = model.get_next_dirty(4, after=HASHES[4], exclude=outstanding)
+
+    assert ours == HASHES[6:]
+    assert theirs == [HASHES[5]] + HASHES[:3]
@@ -0,0 +1,45 @@
+import pytest
+
+from blocks.encoding import (
+    decode_job,
+    encode_job,
+    from_ranges,
+    msgpack,
+    pack,
+    to_ranges,
+    unpack,
+)
+
+TX_HASHES = ['0x' + '11' * 32, '0x' + 'ab' * 32]
+
+
+def test_ranges_round_trip():
+    numbers = [5, 1, 2, 3, 9, 10, 3]
+
+    assert to_ranges(numbers) == [[1, 4], [5, 6], [9, 11]]
+    assert from_ranges(to_ranges(numbers)) == sorted(set(numbers))
+    assert to_ranges([]) == []
+
+
+def test_compact_block_job_round_trip():
+    job = {'job_uuid': 'abc', 'block_numbers': [7, 8, 9, 20]}
+    encoded = encode_job(job)
+
+    assert encoded['block_ranges'] == [[7, 10], [20, 21]]
+    assert 'block_numbers' not in encoded
+    assert decode_job(encoded) == job
+
+
+def test_plain_jobs_decode_unchanged():
+    job = {'job_uuid': 'abc', 'transactions': TX_HASHES}
+
+    assert decode_job(job) == job
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+def test_binary_transaction_job_round_trip():
+    job = {'job_uuid': 'abc', 'transactions': TX_HASHES}
+    encoded = encode_job(job, binary=True)
+
+    assert all(len(tx_hash) == 32 for tx_hash in encoded['transactions'])
+    assert decode_job(unpack(pack(encoded))) == job
@@ -0,0 +1,55 @@
+import pytest
+
+from blocks.conductor.lanes import TIP, BACKFILL, WINDOW, Lanes
+
+
+def take(lanes, has_work=(TIP, BACKFILL)):
+    """ Hand out a job from the first lane in order with work """
+    for lane in lanes.order():
+        if lane in has_work:
+            lanes.record(lane)
+            return lane
+
+    return None
+
+
+def test_lanes_alternate_with_equal_weights():
+    lanes = Lanes({TIP: 1, BACKFILL: 1})
+
+    assert [take(lanes) for _ in range(6)] == [TIP, BACKFILL] * 3
+
+
+def test_lanes_share_jobs_by_weight():
+    lanes = Lanes({TIP: 3, BACKFILL: 1})
+    taken = [take(lanes) for _ in range(WINDOW)]
+
+    assert taken.count(TIP) == 3 * WINDOW // 4
+    assert taken.count(BACKFILL) == WINDOW // 4
+
+
+def test_idle_lane_builds_no_debt():
+    lanes = Lanes({TIP: 1, BACKFILL: 1})
+
+    # Only the backfill has work for a long while
+    for _ in range(10 * WINDOW):
+        assert take(lanes, has_work=(BACKFILL,)) == BACKFILL
+
+    # Once the tip has work it goes first, but only until it has caught up
+    # on the recent window, not on the whole idle stretch
+    taken = [take(lanes) for _ in range(4 * WINDOW)]
+
+    assert WINDOW // 2 <= taken.index(BACKFILL) <= WINDOW // 2 + 1
+
+    # Any window of jobs since then is split evenly
+    for end in range(WINDOW, len(taken)):
+        window = taken[end - WINDOW:end]
+        assert abs(window.count(TIP) - window.count(BACKFILL)) <= 2
+
+
+def test_zero_weight_lanes_are_never_used():
+    lanes = Lanes({TIP: 0, BACKFILL: 1})
+
+    assert lanes.order() == [BACKFILL]
+
+    with pytest.raises(ValueError):
+        Lanes({TIP: 0, BACKFILL: 0})
@@ -0,0 +1,73 @@
+import random
+
+from blocks.conductor.ranges import RangeSet
+
+
+def as_set(rset):
+    return set(rset)
+
+
+def test_add_and_discard_ranges_match_set():
+    rng = random.Random(1)
+    rset = RangeSet()
+    expected = set()
+
+    for _ in range(2000):
+        start = rng.randrange(0, 500)
+        end = start + rng.randrange(0, 40)
+
+        if rng.random() < 0.6:
+            rset.add_range(start, end)
+            expected.update(range(start, end))
+        else:
+            rset.discard_range(start, end)
+            expected.difference_update(range(start, end))
+
+        assert len(rset) == len(expected)
+
+    assert as_set(rset) == expected
+    assert all(s < e for s, e in rset.ranges())
+    assert all(e1 < s2 for (_, e1), (s2, _) in zip(rset.ranges(), list(rset.ranges())[1:]))
+
+
+def test_adjacent_ranges_merge():
+    rset = RangeSet([(0, 5), (5, 10), (12, 15)])
+
+    assert list(rset.ranges()) == [(0, 10), (12, 15)]
+    assert 9 in rset
+    assert 10 not in rset
+
+
+def test_complement():
+    rng = random.Random(2)
+
+    for _ in range(200):
+        expected = set(rng.sample(range(200), rng.randrange(0, 150)))
+        rset = RangeSet()
+        rset.update(expected)
+        start = rng.randrange(0, 100)
+        end = rng.randrange(start, 250)
+
+        assert as_set(rset.complement(start, end)) == set(range(start, end)) - expected
+
+
+def test_complement_of_empty_set_is_whole_range():
+    assert list(RangeSet().complement(3, 8).ranges()) == [(3, 8)]
+    assert len(RangeSet().complement(5, 5)) == 0
+
+
+def test_take_lowest():
+    rset = RangeSet([(0, 3), (10, 20)])
+
+    assert rset.take(5) == [0, 1, 2, 10, 11]
+    assert list(rset.ranges()) == [(12, 20)]
+    assert rset.take(100) == list(range(12, 20))
+    assert not rset
+
+
+def test_take_highest_respects_floor():
+    rset = RangeSet([(0, 10), (20, 25)])
+
+    assert rset.take_highest(3) == [22, 23, 24]
+    assert rset.take_highest(10, floor=8) == [8, 9, 20, 21]
+    assert list(rset.ranges()) == [(0, 8)]
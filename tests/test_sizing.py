@@ -0,0 +1,61 @@
+from blocks.conductor import sizing
+from blocks.conductor.sizing import BatchSizer
+
+
+def test_default_size_until_a_job_finishes():
+    sizer = BatchSizer(60, 100, 10, 1000)
+
+    assert sizer.size('a') == 100
+    assert sizer.size('a', divisor=4) == 25
+
+
+def test_no_target_always_gives_default():
+    sizer = BatchSizer(0, 100, 10, 1000)
+    sizer.start('job', 'a', 100)
+    sizer.finish('job')
+
+    assert sizer.size('a') == 100
+
+
+def test_sizes_to_target_within_bounds(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(sizing, 'monotonic', lambda: now[0])
+    sizer = BatchSizer(60, 100, 10, 1000)
+
+    # 1s per item, so a minute's work is 60 items
+    sizer.start('job1', 'a', 100)
+    now[0] += 100
+    sizer.finish('job1')
+    assert sizer.size('a') == 60
+
+    # Near instant, so the smoothed rate halves to 0.5s per item
+    sizer.start('job2', 'a', 60)
+    now[0] += 0.001
+    sizer.finish('job2')
+    assert sizer.size('a') == 119
+
+    # 0.25s per item would be 240, but growth is capped at MAX_GROWTH times
+    # the last job
+    sizer.start('job3', 'a', 119)
+    now[0] += 0.001
+    sizer.finish('job3')
+    assert sizer.size('a') == 119 * sizing.MAX_GROWTH
+
+    # Very slow, but never below min_size
+    sizer.start('job4', 'a', 238)
+    now[0] += 100000
+    sizer.finish('job4')
+    assert sizer.size('a') == 10
+
+
+def test_cancelled_jobs_are_not_measured(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(sizing, 'monotonic', lambda: now[0])
+    sizer = BatchSizer(60, 100, 10, 1000)
+
+    sizer.start('job', 'a', 100)
+    now[0] += 1000
+    sizer.cancel('job')
+    sizer.finish('job')
+
+    assert sizer.size('a') == 100
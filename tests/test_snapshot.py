@@ -0,0 +1,35 @@
+from blocks.conductor import snapshot
+from blocks.conductor.bitmap import Bitmap
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'conductor.snap')
+    known = Bitmap()
+    known.add_range(0, 100)
+    known.add(150)
+
+    snapshot.save(path, snapshot.Snapshot(watermark=200, known=known))
+    loaded = snapshot.load(path)
+
+    assert loaded.watermark == 200
+    assert set(loaded.known) == set(known)
+
+
+def test_missing_snapshot(tmp_path):
+    assert snapshot.load(str(tmp_path / 'missing.snap')) is None
+
+
+def test_invalid_snapshots_are_ignored(tmp_path):
+    path = tmp_path / 'conductor.snap'
+    known = Bitmap()
+    known.add_range(0, 100)
+    snapshot.save(str(path), snapshot.Snapshot(watermark=200, known=known))
+    data = path.read_bytes()
+
+    # Truncated
+    path.write_bytes(data[:-1])
+    assert snapshot.load(str(path)) is None
+
+    # Older or foreign format
+    path.write_bytes(b'BLKSNAP1' + data[8:])
+    assert snapshot.load(str(path)) is None